@@ -0,0 +1,85 @@
+from fastapi import Query, HTTPException, APIRouter, Depends
+from sqlmodel import select
+import sentry_sdk
+from typing import Union
+from datetime import date
+from ..models.model_rollup import SalesRollup
+from ..utils.custom_types import SectionType, PaymentType, StatusType
+from ..utils.session import SessionDep
+from ..models.model_user import User
+from ..utils.permissions import require_user_type
+
+router = APIRouter()
+
+@router.get(
+    "/analytics/sales",
+    response_model=list[SalesRollup],
+    summary="Resumo de vendas",
+    description="Retorna as vendas pré-agregadas por dia, seção, forma de pagamento e status do pedido, com filtros opcionais por intervalo de datas, seção, forma de pagamento e status.",
+    response_description="Linhas agregadas de vendas.",
+    responses={
+        200: {
+            "description": "Linhas agregadas de vendas.",
+            "content": {
+                "application/json": {
+                    "example": [
+                        {
+                            "roll_day": "2024-06-01",
+                            "roll_section": "blusas",
+                            "roll_typepay": "crédito",
+                            "roll_status": "em andamento",
+                            "roll_orders": 12,
+                            "roll_revenue": 1198.80
+                        }
+                    ]
+                }
+            }
+        },
+        401: {
+            "description": "Erro ao resgatar resumo de vendas.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Erro ao resgatar resumo de vendas."}
+                }
+            }
+        }
+    }
+)
+def analytics_sales_get(
+    session: SessionDep,
+    period_from: Union[date | None] = Query(None, alias="from", example="2024-06-01"),
+    period_to: Union[date | None] = Query(None, alias="to", example="2024-06-30"),
+    section: Union[SectionType | None] = Query(None, alias="section", example="blusas"),
+    typepay: Union[PaymentType | None] = Query(None, alias="typepay", example="crédito"),
+    status: Union[StatusType | None] = Query(None, alias="status", example="em andamento"),
+    current_user: User = Depends(require_user_type(["administrador", "gerente"]))
+):
+    try:
+        query = select(SalesRollup).where(SalesRollup.roll_orders != 0)
+        
+        if period_from:
+            query = query.where(SalesRollup.roll_day >= period_from)
+            
+        if period_to:
+            query = query.where(SalesRollup.roll_day <= period_to)
+            
+        if section:
+            query = query.where(SalesRollup.roll_section == section.value)
+            
+        if typepay:
+            query = query.where(SalesRollup.roll_typepay == typepay.value)
+            
+        if status:
+            query = query.where(SalesRollup.roll_status == status.value)
+            
+        query = query.order_by(
+            SalesRollup.roll_day, 
+            SalesRollup.roll_section, 
+            SalesRollup.roll_typepay, 
+            SalesRollup.roll_status
+        )
+        
+        return session.exec(query).all()
+    except Exception as e:
+        sentry_sdk.capture_exception(e)
+        raise HTTPException(status_code=401, detail="Erro ao resgatar resumo de vendas.")
@@ -1,24 +1,51 @@
-from fastapi import Query, HTTPException, APIRouter, Depends, Path
+from fastapi import Query, HTTPException, APIRouter, Depends, Path, Header, Response, UploadFile, File
 from sqlmodel import select
+from sqlalchemy import tuple_, insert, update
+from sqlalchemy.exc import IntegrityError
 import sentry_sdk
 from typing import  Annotated, Union
 from datetime import datetime
 import re
 from ..models.model_client import Client, ClientCreate, ClientUpdate
+from ..models.model_order import Order
 from ..utils.session import SessionDep
 from ..models.model_user import User
 from ..utils.permissions import require_user_type
+from ..utils.idempotency import request_hash, idempotency_lookup, idempotency_save
+from ..utils.client_summary import client_orders_summary
+from ..utils.search import fuzzy_match, fuzzy_rank
+from ..utils.client_import import import_clients
+from ..utils.autocomplete import client_names, AUTOCOMPLETE_LIMIT
+from ..utils.events import notify_events, client_event
+from ..utils.serialization import model_columns, json_rows, partial_model
 
 router = APIRouter()
+
+CLIENT_UNIQUE_VIOLATIONS = {
+    "ux_client_cli_email_lower": "Já existe um cliente cadastrado com este email.",
+    "ux_client_cli_cpf": "Já existe um cliente cadastrado com este CPF.",
+}
+
+
+
+def unique_violation(error, detail):
+    constraint = getattr(getattr(error.orig, "diag", None), "constraint_name", None)
+    
+    if constraint not in CLIENT_UNIQUE_VIOLATIONS:
+        sentry_sdk.capture_exception(error)
+        return HTTPException(status_code=401, detail=detail)
+    
+    return HTTPException(status_code=409, detail=CLIENT_UNIQUE_VIOLATIONS[constraint])
+
    
 @router.get(
     "/clients",
-    response_model=list[Client],
     summary="Listar clientes",
-    description="Retorna uma lista paginada de clientes cadastrados, podendo filtrar por nome e email.",
+    description="Retorna uma lista paginada de clientes cadastrados, podendo filtrar por nome e email. A busca ignora acentos e maiúsculas, tolera erros de digitação e ordena pelos resultados mais parecidos. O parâmetro fields (ex.: cli_id,cli_name,cli_phone) limita as colunas lidas do banco e retornadas: cada item traz apenas as chaves pedidas.",
     response_description="Lista de clientes encontrados.",
     responses={
         200: {
+            "model": list[partial_model(Client)],
             "description": "Lista de clientes encontrados.",
             "content": {
                 "application/json": {
@@ -37,6 +64,17 @@ router = APIRouter()
                 }
             }
         },
+        400: {
+            "description": "Campo inválido em fields.",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "msg": "Campo(s) inválido(s): ['preco']",
+                        "campos_validos": ["cli_id", "cli_name", "cli_phone"]
+                    }
+                }
+            }
+        },
         401: {
             "description": "Erro ao resgatar clientes.",
             "content": {
@@ -53,22 +91,33 @@ def clients_get(
     email: str = Query(None, alias="email", example="joao@email.com"),
     num_page: Union[int | None] = Query(1, alias="num_page"),
     limit: Annotated[int, Query(le=10)] = 10,
+    fields: Union[str | None] = Query(None, alias="fields", example="cli_id,cli_name,cli_phone"),
     current_user: User = Depends(require_user_type([]))
 ):
     try: 
         offset = (num_page - 1) * limit
         
-        query = select(Client)
+        columns = model_columns(Client, fields)
+        query = select(*columns).where(Client.cli_active == True)
+        ranks = []
 
         if name:
-            query = query.where(Client.cli_name.ilike(f"%{name}%"))
+            query = query.where(fuzzy_match(Client.cli_name, name))
+            ranks.append(fuzzy_rank(Client.cli_name, name).desc())
             
         if email:
-            query = query.where(Client.cli_email.ilike(f"%{email}%"))
+            query = query.where(fuzzy_match(Client.cli_email, email))
+            ranks.append(fuzzy_rank(Client.cli_email, email).desc())
+            
+        if ranks:
+            query = query.order_by(*ranks, Client.cli_id)
 
         results = session.exec(query.offset(offset).limit(limit)).all()
         
-        return results
+        return json_rows(results, columns)
+    
+    except HTTPException:
+        raise
     
     except Exception as e:
         sentry_sdk.capture_exception(e)
@@ -76,11 +125,50 @@ def clients_get(
 
   
   
+@router.get(
+    "/clients/autocomplete",
+    summary="Sugestões de clientes",
+    description="Retorna clientes cujo nome, ou alguma palavra do nome, começa com o texto informado, sem diferenciar acentos e maiúsculas. Atendido por um índice em memória, para sugestões a cada tecla digitada.",
+    response_description="Lista de clientes sugeridos.",
+    responses={
+        200: {
+            "description": "Lista de clientes sugeridos.",
+            "content": {
+                "application/json": {
+                    "example": [
+                        {"cli_id": 1, "cli_name": "João da Silva"}
+                    ]
+                }
+            }
+        },
+        401: {
+            "description": "Erro ao resgatar sugestões de clientes.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Erro ao resgatar sugestões de clientes."}
+                }
+            }
+        }
+    }
+)
+def clients_autocomplete(
+    q: str = Query(..., min_length=1, max_length=30, example="joão"),
+    limit: Annotated[int, Query(ge=1, le=AUTOCOMPLETE_LIMIT)] = 10,
+    current_user: User = Depends(require_user_type([]))
+):
+    try:
+        return client_names.search(q, limit)
+    except Exception as e:
+        sentry_sdk.capture_exception(e)
+        raise HTTPException(status_code=401, detail="Erro ao resgatar sugestões de clientes.")
+
+  
+  
 @router.post(
     "/clients",
     response_model=Client,
     summary="Cadastrar novo cliente",
-    description="Cria um novo cliente com os dados fornecidos. O email e CPF devem ser únicos.",
+    description="Cria um novo cliente com os dados fornecidos. O email (sem diferenciar maiúsculas) e o CPF (apenas dígitos) devem ser únicos. Aceita o cabeçalho Idempotency-Key para que reenvios da mesma requisição retornem o cliente já criado.",
     response_description="Cliente cadastrado com sucesso.",
     responses={
         200: {
@@ -100,6 +188,22 @@ def clients_get(
                 }
             }
         },
+        400: {
+            "description": "CPF inválido.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "CPF inválido."}
+                }
+            }
+        },
+        409: {
+            "description": "Email ou CPF já cadastrado.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Já existe um cliente cadastrado com este email."}
+                }
+            }
+        },
         401: {
             "description": "Erro ao cadastrar cliente.",
             "content": {
@@ -113,41 +217,119 @@ def clients_get(
 def clients_post(
     session: SessionDep, 
     data: ClientCreate, 
+    response: Response,
+    idempotency_key: Union[str | None] = Header(None, alias="Idempotency-Key", max_length=255),
     current_user: User = Depends(require_user_type(["administrador", "gerente", "vendedor"]))
 ):
     try: 
-        email_exists = session.exec(select(Client).where(Client.cli_email == data.cli_email)).first()
-
-        if email_exists:
-            raise HTTPException(status_code=401, detail="Já existe um cliente cadastrado com este email.")
-        
-        cpf_exists = session.exec(select(Client).where(Client.cli_cpf == data.cli_cpf)).first()
-
-        if cpf_exists:
-            raise HTTPException(status_code=401, detail="Já existe um cliente cadastrado com este CPF.")
+        if idempotency_key:
+            payload_hash = request_hash(data)
+            stored = idempotency_lookup(session, idempotency_key, current_user.usr_id, "clients", payload_hash)
+            
+            if stored is not None:
+                response.headers["Idempotent-Replayed"] = "true"
+                return stored
         
         data.cli_phone = re.sub(r'\D', '', data.cli_phone)
         
+        # normalizado antes do INSERT: o índice único compara apenas os dígitos
         data.cli_cpf = re.sub(r'\D', '', data.cli_cpf)
         
-        new_client = Client(
-            **data.dict(),
-            cli_createdat=datetime.utcnow(),
-            cli_id = None,
-        )
+        if len(data.cli_cpf) != 11:
+            raise HTTPException(status_code=400, detail="CPF inválido.")
         
-        session.add(new_client)
+        # a unicidade de email e CPF fica a cargo dos índices únicos: um único INSERT ... RETURNING
+        new_client = session.scalars(
+            insert(Client)
+            .values(**data.dict(), cli_createdat=datetime.utcnow())
+            .returning(Client)
+        ).one()
+        
+        if idempotency_key:
+            idempotency_save(session, idempotency_key, current_user.usr_id, "clients", payload_hash, new_client)
+        
+        notify_events(session, [client_event(new_client)])
+        
+        # fora da sessão, o commit não expira o objeto e a resposta dispensa o refresh
+        session.expunge(new_client)
         session.commit()
-        session.refresh(new_client)
+        client_names.add(new_client.cli_id, new_client.cli_name)
         
         return new_client 
     
+    except HTTPException:
+        raise
+    
+    except IntegrityError as e:
+        raise unique_violation(e, "Erro ao cadastrar cliente.")
+    
     except Exception as e:
         sentry_sdk.capture_exception(e)
         raise HTTPException(status_code=401, detail="Erro ao cadastrar cliente.")
 
 
 
+@router.post(
+    "/clients/import",
+    summary="Importar clientes em lote",
+    description="Importa clientes a partir de um arquivo CSV (com cabeçalho) ou NDJSON (um objeto JSON por linha), com os campos cli_name, cli_email, cli_cpf, cli_phone e cli_address. CPF e telefone são normalizados como no cadastro individual. Linhas repetidas no próprio arquivo ou já cadastradas (mesmo CPF ou email) são ignoradas. O relatório traz os totais por situação e, até 1000 linhas, o motivo de cada linha não inserida (rows_truncated indica que a lista foi cortada).",
+    response_description="Relatório da importação.",
+    responses={
+        200: {
+            "description": "Relatório da importação.",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "total": 4,
+                        "inserido": 1,
+                        "duplicado": 1,
+                        "duplicado_arquivo": 1,
+                        "invalido": 1,
+                        "rows": [
+                            {"line": 3, "status": "duplicado_arquivo", "detail": "CPF ou email repetido no arquivo."},
+                            {"line": 4, "status": "duplicado", "detail": "Cliente já cadastrado com este CPF ou email."},
+                            {"line": 5, "status": "invalido", "detail": "Email inválido."}
+                        ],
+                        "rows_truncated": False
+                    }
+                }
+            }
+        },
+        401: {
+            "description": "Erro ao importar clientes.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Erro ao importar clientes."}
+                }
+            }
+        }
+    }
+)
+def clients_import(
+    session: SessionDep,
+    file: UploadFile = File(...),
+    file_format: Union[str | None] = Query(None, alias="format", pattern="^(csv|ndjson)$", example="csv"),
+    current_user: User = Depends(require_user_type(["administrador", "gerente"]))
+):
+    try:
+        if not file_format:
+            file_format = "ndjson" if (file.filename or "").lower().endswith((".ndjson", ".jsonl")) else "csv"
+            
+        report = import_clients(session, file.file, file_format)
+        
+        # em vez de um evento por cliente, os índices de autocomplete são reconstruídos
+        if report["inserido"]:
+            notify_events(session, [{"type": "client", "rebuild": True}])
+            session.commit()
+            client_names.invalidate()
+            
+        return report
+    except Exception as e:
+        sentry_sdk.capture_exception(e)
+        raise HTTPException(status_code=401, detail="Erro ao importar clientes.")
+
+
+
 @router.get(
     "/clients/{id}",
     response_model=Client,
@@ -198,16 +380,117 @@ def clients_get(
     try: 
         client = session.get(Client, id)
         
-        if not client:
+        if not client or not client.cli_active:
             raise HTTPException(status_code=404, detail="Não foi possível encontrar este cliente.")
         
         return client
+    except HTTPException:
+        raise
     except Exception as e:
         sentry_sdk.capture_exception(e)
         raise HTTPException(status_code=401, detail="Erro ao resgatar cliente.")
 
 
 
+@router.get(
+    "/clients/{id}/orders",
+    summary="Histórico de pedidos do cliente",
+    description="Retorna os pedidos de um cliente do mais recente para o mais antigo, com paginação por cursor (before/before_id, copiados de next da página anterior). Com summary=true, inclui quantidade de pedidos, valor total (sem cancelados e reembolsados) e data do último pedido.",
+    response_description="Página do histórico de pedidos.",
+    responses={
+        200: {
+            "description": "Página do histórico de pedidos.",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "orders": [
+                            {
+                                "order_id": 15,
+                                "order_createdat": "2024-06-01T12:00:00",
+                                "order_total": 99.90,
+                                "order_status": "entregue"
+                            }
+                        ],
+                        "next": {"before": "2024-06-01T12:00:00", "before_id": 15},
+                        "summary": {
+                            "orders": 12,
+                            "lifetime_value": 1198.80,
+                            "last_order": "2024-06-01T12:00:00"
+                        }
+                    }
+                }
+            }
+        },
+        404: {
+            "description": "Cliente não encontrado.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Não foi possível encontrar este cliente."}
+                }
+            }
+        },
+        401: {
+            "description": "Erro ao resgatar pedidos do cliente.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Erro ao resgatar pedidos do cliente."}
+                }
+            }
+        }
+    }
+)
+def clients_orders_get(
+    session: SessionDep, 
+    current_user: User = Depends(require_user_type([])), 
+    id: int = Path(..., example=1, description="ID do cliente"),
+    before: Union[datetime | None] = Query(None, alias="before", example="2024-06-01T12:00:00"),
+    before_id: Union[int | None] = Query(None, alias="before_id", example=15),
+    limit: Annotated[int, Query(ge=1, le=50)] = 20,
+    summary: bool = False
+):
+    try: 
+        client = session.get(Client, id)
+        
+        if not client or not client.cli_active:
+            raise HTTPException(status_code=404, detail="Não foi possível encontrar este cliente.")
+        
+        # apenas colunas do índice ix_order_cli_createdat: a página sai de um index-only scan
+        query = select(
+            Order.order_id, 
+            Order.order_createdat, 
+            Order.order_total, 
+            Order.order_status
+        ).where(Order.order_cli == id)
+        
+        if before and before_id:
+            query = query.where(tuple_(Order.order_createdat, Order.order_id) < tuple_(before, before_id))
+        elif before:
+            query = query.where(Order.order_createdat < before)
+            
+        query = query.order_by(Order.order_createdat.desc(), Order.order_id.desc()).limit(limit)
+        
+        orders = [dict(row._mapping) for row in session.exec(query).all()]
+        
+        result = {
+            "orders": orders,
+            "next": None,
+        }
+        
+        if len(orders) == limit:
+            result["next"] = {"before": orders[-1]["order_createdat"], "before_id": orders[-1]["order_id"]}
+            
+        if summary:
+            result["summary"] = client_orders_summary(session, id)
+        
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        sentry_sdk.capture_exception(e)
+        raise HTTPException(status_code=401, detail="Erro ao resgatar pedidos do cliente.")
+
+
+
 @router.put(
     "/clients/{id}",
     response_model=Client,
@@ -240,6 +523,14 @@ def clients_get(
                 }
             }
         },
+        409: {
+            "description": "Email já cadastrado.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Já existe um cliente cadastrado com este email."}
+                }
+            }
+        },
         401: {
             "description": "Erro ao editar cliente.",
             "content": {
@@ -259,19 +550,29 @@ def clients_put(
     try: 
         client = session.get(Client, id)
         
-        if not client:
+        if not client or not client.cli_active:
             raise HTTPException(status_code=404, detail="Não foi possível encontrar este cliente.")
         
         client_data = data.dict(exclude_unset=True)
         
         for key, value in client_data.items():
             setattr(client, key, value)
+            
+        if "cli_name" in client_data:
+            notify_events(session, [client_event(client)])
                 
         session.add(client)
         session.commit()
         session.refresh(client)
+        
+        if "cli_name" in client_data:
+            client_names.add(client.cli_id, client.cli_name)
 
         return client
+    except HTTPException:
+        raise
+    except IntegrityError as e:
+        raise unique_violation(e, "Erro ao editar cliente.")
     except Exception as e:
         sentry_sdk.capture_exception(e)
         raise HTTPException(status_code=401, detail="Erro ao editar cliente.")
@@ -281,7 +582,7 @@ def clients_put(
 @router.delete(
     "/clients/{id}",
     summary="Deletar cliente",
-    description="Remove um cliente do sistema pelo seu ID.",
+    description="Remove um cliente pelo seu ID. A remoção é lógica: o cliente deixa de aparecer nas consultas, libera email e CPF para novos cadastros e é expurgado depois por um processo em segundo plano, caso não tenha pedidos.",
     response_description="Confirmação de remoção do cliente.",
     responses={
         200: {
@@ -316,16 +617,26 @@ def clients_delete(
     id: int = Path(..., example=1, description="ID do cliente")
 ):
     try: 
-        client = session.get(Client, id)
+        # remoção lógica: o expurgo definitivo fica com o job em segundo plano
+        client = session.execute(
+            update(Client)
+            .where(Client.cli_id == id, Client.cli_active == True)
+            .values(cli_active=False, cli_deletedat=datetime.utcnow())
+            .returning(Client.cli_id, Client.cli_name)
+        ).first()
         
         if not client:
             raise HTTPException(status_code=404, detail="Não foi possível encontrar este cliente.")
         
-        session.delete(client)
+        notify_events(session, [client_event(client, deleted=True)])
         session.commit()
+        client_names.remove(id)
         
         return {"ok": True}
     
+    except HTTPException:
+        raise
+    
     except Exception as e:
         sentry_sdk.capture_exception(e)
         raise HTTPException(status_code=401, detail="Erro ao deletar cliente.")
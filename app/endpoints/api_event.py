@@ -0,0 +1,70 @@
+from fastapi import Query, APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+import asyncio, json
+from typing import Union
+from ..utils.custom_types import SectionType
+from ..utils.events import broker
+from ..models.model_user import User
+from ..utils.permissions import require_user_type
+
+router = APIRouter()
+
+EVENTS_KEEPALIVE_SECONDS = 15
+
+
+
+@router.get(
+    "/events",
+    summary="Acompanhar pedidos e estoque em tempo real",
+    description="Abre um fluxo Server-Sent Events com as alterações de pedidos e de estoque confirmadas no banco, opcionalmente filtradas por seção, produto ou cliente. Substitui a consulta periódica de /orders e /products/{id}.",
+    response_description="Fluxo text/event-stream de eventos.",
+    responses={
+        200: {
+            "description": "Fluxo de eventos.",
+            "content": {
+                "text/event-stream": {
+                    "example": 'event: order\ndata: {"type": "order", "order_id": 1, "order_status": "em andamento", "order_section": "blusas", "order_cli": 1, "order_prods": [1, 2]}\n\n'
+                }
+            }
+        },
+        401: {
+            "description": "Token inválido ou expirado.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Token inválido ou expirado."}
+                }
+            }
+        }
+    }
+)
+async def events_stream(
+    request: Request,
+    section: Union[SectionType | None] = Query(None, alias="section", example="blusas"),
+    product: Union[int | None] = Query(None, alias="product", example=1),
+    client: Union[int | None] = Query(None, alias="client", example=1),
+    current_user: User = Depends(require_user_type([]))
+):
+    queue = broker.subscribe(
+        section=section.value if section else None, 
+        product=product, 
+        client=client
+    )
+
+    async def stream():
+        try:
+            yield ": conectado\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        finally:
+            broker.unsubscribe(queue)
+
+    return StreamingResponse(
+        stream(), 
+        media_type="text/event-stream", 
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,93 @@
+from fastapi import HTTPException, APIRouter, Depends, Header
+from fastapi.responses import PlainTextResponse
+from typing import Union
+import sentry_sdk, os
+from ..models.model_user import User
+from ..utils.permissions import require_user_type
+from ..utils.retry import transaction_metrics
+from ..utils.metrics import collect_snapshots, render_metrics
+
+router = APIRouter()
+
+# opcional: exige "Authorization: Bearer <METRICS_TOKEN>" do coletor
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+@router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    summary="Métricas no formato Prometheus",
+    description="Expõe histogramas de latência por rota e status, requisições em andamento, uso do pool de conexões e do threadpool, acertos de cache, transações repetidas e instruções SQL por rota, somando todos os workers quando METRICS_DIR está configurado.",
+    response_description="Métricas no formato de texto do Prometheus.",
+    responses={
+        200: {
+            "description": "Métricas no formato de texto do Prometheus.",
+            "content": {
+                "text/plain": {
+                    "example": "# TYPE http_request_duration_seconds histogram\nhttp_request_duration_seconds_bucket{method=\"GET\",route=\"/orders\",status=\"200\",le=\"0.05\"} 12\n"
+                }
+            }
+        },
+        401: {
+            "description": "Token de métricas inválido.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Token de métricas inválido."}
+                }
+            }
+        }
+    }
+)
+def metrics_get(
+    authorization: Union[str | None] = Header(None, alias="Authorization")
+):
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Token de métricas inválido.")
+    
+    try:
+        return render_metrics(collect_snapshots())
+    except Exception as e:
+        sentry_sdk.capture_exception(e)
+        raise HTTPException(status_code=401, detail="Erro ao resgatar métricas.")
+    
+    
+    
+
+@router.get(
+    "/metrics/transactions",
+    summary="Métricas de transações",
+    description="Retorna, por endpoint, quantas transações foram confirmadas, repetidas após deadlock ou falha de serialização e abortadas após esgotar as tentativas.",
+    response_description="Contadores de transações por endpoint.",
+    responses={
+        200: {
+            "description": "Contadores de transações por endpoint.",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "orders_post": {
+                            "committed": 120,
+                            "retried": 3,
+                            "aborted": 0,
+                            "pgcode_40P01": 3
+                        }
+                    }
+                }
+            }
+        },
+        401: {
+            "description": "Erro ao resgatar métricas.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Erro ao resgatar métricas."}
+                }
+            }
+        }
+    }
+)
+def metrics_transactions_get(
+    current_user: User = Depends(require_user_type(["administrador", "gerente"]))
+):
+    try:
+        return transaction_metrics()
+    except Exception as e:
+        sentry_sdk.capture_exception(e)
+        raise HTTPException(status_code=401, detail="Erro ao resgatar métricas.")
@@ -1,28 +1,36 @@
-from fastapi import Query, HTTPException, APIRouter, Depends, Path
+from fastapi import Query, HTTPException, APIRouter, Depends, Path, Header, Response
 from sqlmodel import select
 import sentry_sdk
 from typing import  Annotated, Union
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+from collections import Counter
 from ..models.model_client import Client
 from ..models.model_product import Product
-from ..models.model_order import Order, OrderCreate, OrderUpdate
+from ..models.model_order import Order, OrderCreate, OrderUpdate, OrderBulkStatus
 from ..utils.custom_types import StatusType
 from ..utils.session import SessionDep
 from ..models.model_user import User
 from ..utils.permissions import require_user_type
-from ..utils.services import to_str_lower
+from ..utils.idempotency import request_hash, idempotency_lookup, idempotency_save
+from ..utils.rollups import update_sales_rollup
+from ..utils.order_status import lock_orders, transition_orders, BULK_STATUS_LIMIT
+from ..utils.stock import restock_orders, lock_products
+from ..utils.reservations import reserve_stock, release_reservations
+from ..utils.events import publish_events, order_event, product_event
+from ..utils.retry import transaction_attempts
+from ..utils.serialization import model_columns, json_rows, partial_model
 
 
 router = APIRouter()
 
 @router.get(
     "/orders",
-    response_model=list[Order],
     summary="Listar pedidos",
-    description="Retorna uma lista paginada de pedidos cadastrados, com filtros opcionais por período, seção, status, cliente ou ID.",
+    description="Retorna uma lista paginada de pedidos cadastrados, com filtros opcionais por período (dia exato ou intervalo from/to), seção, status, cliente, produto ou ID. O parâmetro fields (ex.: order_id,order_cli,order_total,order_status) limita as colunas lidas do banco e retornadas: cada item traz apenas as chaves pedidas.",
     response_description="Lista de pedidos encontrados.",
     responses={
         200: {
+            "model": list[partial_model(Order)],
             "description": "Lista de pedidos encontrados.",
             "content": {
                 "application/json": {
@@ -35,6 +43,10 @@ router = APIRouter()
                             "order_typepay": "crédito",
                             "order_address": "Rua das Palmeiras 15",
                             "order_prods": [1, 2],
+                            "order_items": [
+                                {"prod_id": 1, "qty": 1, "price": 59.90},
+                                {"prod_id": 2, "qty": 1, "price": 40.00}
+                            ],
                             "order_period": "2024-06-01T12:00:00",
                             "order_createdat": "2024-06-01T12:00:00",
                             "order_status": "em andamento"
@@ -43,6 +55,17 @@ router = APIRouter()
                 }
             }
         },
+        400: {
+            "description": "Campo inválido em fields.",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "msg": "Campo(s) inválido(s): ['preco']",
+                        "campos_validos": ["order_id", "order_cli", "order_total", "order_status"]
+                    }
+                }
+            }
+        },
         401: {
             "description": "Erro ao resgatar pedidos.",
             "content": {
@@ -56,37 +79,54 @@ router = APIRouter()
 def orders_get( 
     session: SessionDep,
     period: Union[date | None] = Query(None, alias="period", example="2023-12-31"),
+    period_from: Union[date | None] = Query(None, alias="from", example="2023-12-01"),
+    period_to: Union[date | None] = Query(None, alias="to", example="2023-12-31"),
     section: Union[str | None] = Query(None, alias="section", example="Feminino"),
-    id: Union[int | None] = Path(..., example=1, description="ID do pedido"),
+    id: Union[int | None] = Query(None, alias="id", example=1, description="ID do pedido"),
     status: Union[StatusType | None] = Query(None, alias="status", example="em andamento"),
     client: Union[int | None] = Query(None, alias="client", example=1),
+    product: Union[int | None] = Query(None, alias="product", example=1),
     num_page: int = 1,
     limit: Annotated[int, Query(le=10)] = 10,
+    fields: Union[str | None] = Query(None, alias="fields", example="order_id,order_cli,order_total,order_status"),
     current_user: User = Depends(require_user_type([]))
 ):
     try: 
         offset = (num_page - 1) * limit
         
-        query = select(Order)
+        columns = model_columns(Order, fields)
+        query = select(*columns)
 
         if period:
-            query = query.where(Order.order_period == period)
+            period_from = period_to = period
+            
+        if period_from:
+            query = query.where(Order.order_createdat >= period_from)
+            
+        if period_to:
+            query = query.where(Order.order_createdat < period_to + timedelta(days=1))
             
         if id:
             query = query.where(Order.order_id == id)
             
         if status:
-            query = query.where(Order.order_status == status.lower())
+            # a coluna guarda o nome do membro: compara com o enum, não com o texto
+            query = query.where(Order.order_status == status)
             
         if section:
             query = query.where(Order.order_section == section.lower())
             
         if client:
             query = query.where(Order.order_cli == client)
+            
+        if product:
+            query = query.where(Order.order_prods.contains([product]))
 
         results = session.exec(query.offset(offset).limit(limit)).all()
         
-        return results
+        return json_rows(results, columns)
+    except HTTPException:
+        raise
     except Exception as e:
         sentry_sdk.capture_exception(e)
         raise HTTPException(status_code=401, detail="Erro ao resgatar pedidos.")
@@ -97,7 +137,7 @@ def orders_get(
     "/orders",
     response_model=Order,
     summary="Criar novo pedido",
-    description="Cria um novo pedido para um cliente, com os produtos e informações fornecidas.",
+    description="Cria um novo pedido para um cliente, com os produtos e informações fornecidas. O estoque fica reservado até a confirmação do pagamento; pedidos não confirmados dentro do prazo são cancelados automaticamente. Produtos repetidos em order_prods contam como quantidade e o total é calculado pelo servidor a partir dos preços atuais; um order_total informado que divirja do calculado é rejeitado. Aceita o cabeçalho Idempotency-Key para que reenvios da mesma requisição retornem o pedido já criado.",
     response_description="Pedido criado com sucesso.",
     responses={
         200: {
@@ -112,6 +152,10 @@ def orders_get(
                         "order_typepay": "crédito",
                         "order_address": "Rua das Palmeiras 15",
                         "order_prods": [1, 2],
+                        "order_items": [
+                            {"prod_id": 1, "qty": 1, "price": 59.90},
+                            {"prod_id": 2, "qty": 1, "price": 40.00}
+                        ],
                         "order_period": "2024-06-01T12:00:00",
                         "order_createdat": "2024-06-01T12:00:00",
                         "order_status": "em andamento"
@@ -128,13 +172,29 @@ def orders_get(
             }
         },
         400: {
-            "description": "Produto sem estoque.",
+            "description": "Produto sem estoque ou total divergente.",
             "content": {
                 "application/json": {
                     "example": {"detail": "Produto 'Produto X' está sem estoque."}
                 }
             }
         },
+        422: {
+            "description": "Chave de idempotência reutilizada com outro conteúdo.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Chave de idempotência já utilizada com outra requisição."}
+                }
+            }
+        },
+        409: {
+            "description": "Conflito com outra operação simultânea.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Conflito com outra operação simultânea, tente novamente."}
+                }
+            }
+        },
         401: {
             "description": "Erro ao criar pedido.",
             "content": {
@@ -148,39 +208,79 @@ def orders_get(
 def orders_post(
     session: SessionDep, 
     data: OrderCreate, 
+    response: Response,
+    idempotency_key: Union[str | None] = Header(None, alias="Idempotency-Key", max_length=255),
     current_user: User = Depends(require_user_type(["administrador", "gerente", "vendedor", "atendente"]))
 ):
     try: 
-        client = session.exec(select(Client).where(Client.cli_id == data.order_cli)).first()
+        for attempt in transaction_attempts(session, "orders_post"):
+            with attempt:
+                if idempotency_key:
+                    payload_hash = request_hash(data)
+                    stored = idempotency_lookup(session, idempotency_key, current_user.usr_id, "orders", payload_hash)
+            
+                    if stored is not None:
+                        response.headers["Idempotent-Replayed"] = "true"
+                        return stored
+        
+                client = session.exec(select(Client).where(Client.cli_id == data.order_cli, Client.cli_active == True)).first()
         
-        if not client:
-            raise HTTPException(status_code=404, detail="Cliente não reconhecido.")
+                if not client:
+                    raise HTTPException(status_code=404, detail="Cliente não reconhecido.")
+
+                quantities = Counter(data.order_prods)
 
-        products = session.exec(select(Product).where(Product.prod_id.in_(data.order_prods))).all()
+                products = lock_products(session, quantities)
         
-        if len(products) != len(data.order_prods):
-            raise HTTPException(status_code=404, detail="Um ou mais produtos não foram encontrados.")
+                if len(products) != len(quantities):
+                    raise HTTPException(status_code=404, detail="Um ou mais produtos não foram encontrados.")
         
-        for prod in products:
-            if prod.prod_stock < 1:
-                raise HTTPException(status_code=400, detail=f"Produto '{prod.prod_name}' está sem estoque.")
+                for prod in products:
+                    if prod.prod_stock < quantities[prod.prod_id]:
+                        raise HTTPException(status_code=400, detail=f"Produto '{prod.prod_name}' está sem estoque.")
         
-        for prod in products:
-            prod.prod_stock -= 1
-            session.add(prod)
+                # preço congelado no momento da compra, a partir da mesma consulta de produtos
+                order_items = [
+                    {"prod_id": prod.prod_id, "qty": quantities[prod.prod_id], "price": prod.prod_price}
+                    for prod in products
+                ]
+                order_total = round(sum(item["qty"] * item["price"] for item in order_items), 2)
+        
+                if data.order_total is not None and abs(data.order_total - order_total) >= 0.01:
+                    raise HTTPException(
+                        status_code=400, 
+                        detail=f"Total do pedido divergente: informado {data.order_total:.2f}, calculado {order_total:.2f}."
+                    )
+        
+                for prod in products:
+                    prod.prod_stock -= quantities[prod.prod_id]
+                    session.add(prod)
 
-        new_order = Order(
-            **data.dict(),
-            order_period=datetime.utcnow(),   
-            order_status=StatusType.andamento,
-            order_createdat=datetime.utcnow(),
-        )
+                new_order = Order(
+                    **data.dict(exclude={"order_total"}),
+                    order_total=order_total,
+                    order_items=order_items,
+                    order_period=datetime.utcnow(),   
+                    order_status=StatusType.andamento,
+                    order_createdat=datetime.utcnow(),
+                )
 
-        session.add(new_order)
-        session.commit()
-        session.refresh(new_order)
+                session.add(new_order)
+                session.flush()
+        
+                update_sales_rollup(session, [(new_order, new_order.order_status, 1)])
+                reserve_stock(session, new_order.order_id, quantities)
+                publish_events(session, [order_event(new_order)] + [product_event(prod) for prod in products])
+        
+                if idempotency_key:
+                    idempotency_save(session, idempotency_key, current_user.usr_id, "orders", payload_hash, new_order)
+        
+                session.commit()
+                session.refresh(new_order)
 
-        return new_order
+                return new_order
+    except HTTPException:
+        raise
     except Exception as e:
         sentry_sdk.capture_exception(e)
         raise HTTPException(status_code=401, detail="Erro ao criar pedido.")
@@ -206,6 +306,10 @@ def orders_post(
                         "order_typepay": "crédito",
                         "order_address": "Rua das Palmeiras 15",
                         "order_prods": [1, 2],
+                        "order_items": [
+                            {"prod_id": 1, "qty": 1, "price": 59.90},
+                            {"prod_id": 2, "qty": 1, "price": 40.00}
+                        ],
                         "order_period": "2024-06-01T12:00:00",
                         "order_createdat": "2024-06-01T12:00:00",
                         "order_status": "em andamento"
@@ -237,12 +341,15 @@ def orders_get(
     id: int = Path(..., example=1, description="ID do pedido")
 ):
     try: 
-        order = session.get(Order, id)
+        # só o id é conhecido: a consulta passa pelo índice da chave primária de cada partição
+        order = session.exec(select(Order).where(Order.order_id == id)).first()
         
         if not order:
             raise HTTPException(status_code=404, detail="Não foi possível encontrar este pedido")
         
         return order
+    except HTTPException:
+        raise
     except Exception as e:
         sentry_sdk.capture_exception(e)
         raise HTTPException(status_code=401, detail="Erro ao resgatar pedido.")
@@ -252,7 +359,7 @@ def orders_get(
 @router.put(
     "/orders/{id}",
     summary="Atualizar pedido",
-    description="Atualiza o status de um pedido existente pelo ID.",
+    description="Atualiza o status de um pedido existente pelo ID, respeitando as transições de status permitidas. Ao cancelar ou reembolsar, o estoque dos produtos é devolvido uma única vez.",
     response_description="Pedido atualizado com sucesso.",
     responses={
         200: {
@@ -267,13 +374,25 @@ def orders_get(
                         "order_typepay": "crédito",
                         "order_address": "Rua das Palmeiras 15",
                         "order_prods": [1, 2],
+                        "order_items": [
+                            {"prod_id": 1, "qty": 1, "price": 59.90},
+                            {"prod_id": 2, "qty": 1, "price": 40.00}
+                        ],
                         "order_period": "2024-06-01T12:00:00",
                         "order_createdat": "2024-06-01T12:00:00",
-                        "order_status": "finalizado"
+                        "order_status": "pagamento confirmado"
                     }
                 }
             }
         },
+        400: {
+            "description": "Status inválido ou transição não permitida.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Transição inválida: 'cancelado' -> 'em andamento'."}
+                }
+            }
+        },
         404: {
             "description": "Pedido não encontrado.",
             "content": {
@@ -282,6 +401,14 @@ def orders_get(
                 }
             }
         },
+        409: {
+            "description": "Conflito com outra operação simultânea.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Conflito com outra operação simultânea, tente novamente."}
+                }
+            }
+        },
         401: {
             "description": "Erro ao editar pedido.",
             "content": {
@@ -299,33 +426,150 @@ def orders_put(
     id: int = Path(..., example=1, description="ID do pedido"),
 ):
     try: 
-        data.order_status = to_str_lower(data.order_status)
+        for attempt in transaction_attempts(session, "orders_put"):
+            with attempt:
+                try:
+                    new_status = StatusType(data.order_status)
+                except ValueError:
+                    raise HTTPException(status_code=400, detail="Status de pedido inválido.")
         
-        order = session.get(Order, id)
+                # mesmo caminho do endpoint em lote: trava o pedido e só aplica transições permitidas
+                orders = lock_orders(session, [Order.order_id == id], limit=1)
         
-        if not order:
-            raise HTTPException(status_code=404, detail="Não foi possível encontrar este pedido")
+                if not orders:
+                    raise HTTPException(status_code=404, detail="Não foi possível encontrar este pedido")
         
-        order_data = data.dict(exclude_unset=True)
-        
-        for key, value in order_data.items():
-            setattr(order, key, value)
+                # repetir o status atual não reaplica estoque, reservas nem eventos
+                if StatusType(orders[0].order_status) != new_status:
+                    results, moved = transition_orders(session, orders, new_status)
+            
+                    if not moved:
+                        raise HTTPException(status_code=400, detail=results[0]["detail"])
                 
-        session.add(order)
-        session.commit()
-        session.refresh(order)
+                session.commit()
 
-        return order   
+                return session.exec(select(Order).where(Order.order_id == id)).one()
+    except HTTPException:
+        raise
     except Exception as e:
         sentry_sdk.capture_exception(e)
         raise HTTPException(status_code=401, detail="Erro ao editar pedido.")
     
     
     
+@router.post(
+    "/orders/bulk-status",
+    summary="Atualizar status de pedidos em lote",
+    description="Aplica uma mudança de status a uma lista de IDs e/ou aos pedidos que atendem aos filtros informados, respeitando as transições de status permitidas. Transições inválidas são reportadas por pedido sem interromper o lote, e todas as alterações são gravadas em uma única transação. Um lote aceita até 5000 pedidos: filtros que atendem a mais pedidos são recusados com 422.",
+    response_description="Resultado da atualização por pedido.",
+    responses={
+        200: {
+            "description": "Lote processado.",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "updated": 1,
+                        "results": [
+                            {"order_id": 1, "ok": True, "detail": None},
+                            {"order_id": 2, "ok": False, "detail": "Transição inválida: 'entregue' -> 'a caminho'."},
+                            {"order_id": 3, "ok": False, "detail": "Não foi possível encontrar este pedido"}
+                        ]
+                    }
+                }
+            }
+        },
+        400: {
+            "description": "Nenhum pedido ou filtro informado.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Informe os IDs dos pedidos ou ao menos um filtro."}
+                }
+            }
+        },
+        409: {
+            "description": "Conflito com outra operação simultânea.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Conflito com outra operação simultânea, tente novamente."}
+                }
+            }
+        },
+        422: {
+            "description": "Mais pedidos atendem aos filtros do que o limite de um lote.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Mais de 5000 pedidos atendem aos filtros; refine os filtros ou divida o lote."}
+                }
+            }
+        },
+        401: {
+            "description": "Erro ao atualizar pedidos.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Erro ao atualizar pedidos."}
+                }
+            }
+        }
+    }
+)
+def orders_bulk_status(
+    session: SessionDep,
+    data: OrderBulkStatus,
+    current_user: User = Depends(require_user_type(["administrador", "gerente"])),
+):
+    try:
+        for attempt in transaction_attempts(session, "orders_bulk_status"):
+            with attempt:
+                where = []
+        
+                if data.order_ids:
+                    where.append(Order.order_id.in_(data.order_ids))
+            
+                if data.filter_status:
+                    where.append(Order.order_status == data.filter_status)
+            
+                if data.filter_section:
+                    where.append(Order.order_section == data.filter_section)
+            
+                if data.filter_client:
+                    where.append(Order.order_cli == data.filter_client)
+            
+                if not where:
+                    raise HTTPException(status_code=400, detail="Informe os IDs dos pedidos ou ao menos um filtro.")
+        
+                # um a mais que o limite: filtro que casa com pedidos demais é recusado, não cortado em silêncio
+                orders = lock_orders(session, where, limit=BULK_STATUS_LIMIT + 1)
+        
+                if len(orders) > BULK_STATUS_LIMIT:
+                    raise HTTPException(
+                        status_code=422,
+                        detail=f"Mais de {BULK_STATUS_LIMIT} pedidos atendem aos filtros; refine os filtros ou divida o lote."
+                    )
+        
+                results, moved = transition_orders(session, orders, data.order_status)
+        
+                if data.order_ids:
+                    found = {order.order_id for order in orders}
+                    results += [
+                        {"order_id": order_id, "ok": False, "detail": "Não foi possível encontrar este pedido"}
+                        for order_id in dict.fromkeys(data.order_ids) if order_id not in found
+                    ]
+        
+                session.commit()
+        
+                return {"updated": len(moved), "results": results}
+    except HTTPException:
+        raise
+    except Exception as e:
+        sentry_sdk.capture_exception(e)
+        raise HTTPException(status_code=401, detail="Erro ao atualizar pedidos.")
+    
+    
+    
 @router.delete(
     "/orders/{id}",
     summary="Deletar pedido",
-    description="Remove um pedido do sistema pelo seu ID.",
+    description="Remove um pedido do sistema pelo seu ID, devolvendo o estoque dos produtos caso ainda não tenha sido devolvido.",
     response_description="Confirmação de remoção do pedido.",
     responses={
         200: {
@@ -344,6 +588,14 @@ def orders_put(
                 }
             }
         },
+        409: {
+            "description": "Conflito com outra operação simultânea.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Conflito com outra operação simultânea, tente novamente."}
+                }
+            }
+        },
         401: {
             "description": "Erro ao deletar pedido.",
             "content": {
@@ -360,15 +612,23 @@ def orders_delete(
     id: int = Path(..., example=1, description="ID do pedido"),
 ):
     try: 
-        order = session.get(Order, id)
+        for attempt in transaction_attempts(session, "orders_delete"):
+            with attempt:
+                order = session.exec(select(Order).where(Order.order_id == id).with_for_update()).first()
         
-        if not order:
-            raise HTTPException(status_code=404, detail="Não foi possível encontrar este pedido")
+                if not order:
+                    raise HTTPException(status_code=404, detail="Não foi possível encontrar este pedido")
+        
+                update_sales_rollup(session, [(order, order.order_status, -1)])
+                release_reservations(session, [order.order_id])
+                restock_orders(session, [order.order_id])
         
-        session.delete(order)
-        session.commit()
+                session.delete(order)
+                session.commit()
         
-        return {"ok": True}
+                return {"ok": True}
+    except HTTPException:
+        raise
     except Exception as e:
         sentry_sdk.capture_exception(e)
         raise HTTPException(status_code=401, detail="Erro ao deletar pedido.")
@@ -1,27 +1,33 @@
 from fastapi import Query, HTTPException, APIRouter, Depends, UploadFile, File, Form, Path
 from sqlmodel import select
+from sqlalchemy import func, update
 import sentry_sdk, os, json
 from uuid import uuid4
 from typing import  Annotated, Union
 from datetime import datetime
 from ..models.model_product import Product
+from ..models.model_reservation import StockReservation
 from ..utils.custom_types import VALID_SIZE_TYPES, VALID_COLOR_TYPES, VALID_CATEGORY_TYPES, VALID_SECTION_TYPES, CategoryType
-from ..utils.services import to_str_lower, handle_upload_images, handle_delete_images
+from ..utils.services import to_str_lower, handle_upload_images, save_image_files, delete_image_files
 from ..utils.session import SessionDep
 from ..models.model_user import User
 from ..utils.permissions import require_user_type
+from ..utils.events import publish_events, product_event
+from ..utils.stock import lock_products
+from ..utils.retry import transaction_attempts
+from ..utils.serialization import model_columns, json_rows, partial_model
 
 router = APIRouter()
 
 
 
 @router.get("/products", 
-    response_model=list[Product], 
     summary="Lista produtos com filtros opcionais", 
     response_description="Lista de produtos conforme filtros aplicados.",  
-    description="Retorna uma lista paginada de produtos. Permite filtrar por categoria, preço e disponibilidade em estoque.",
+    description="Retorna uma lista paginada de produtos. Permite filtrar por categoria, preço e disponibilidade em estoque. O parâmetro fields (ex.: prod_id,prod_name,prod_price,prod_stock) limita as colunas lidas do banco e retornadas: cada item traz apenas as chaves pedidas.",
     responses={
         200: {
+            "model": list[partial_model(Product)],
             "description": "Lista de produtos encontrados.",
             "content": {
                 "application/json": {
@@ -47,6 +53,17 @@ router = APIRouter()
                 }
             }
         },
+        400: {
+            "description": "Campo inválido em fields.",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "msg": "Campo(s) inválido(s): ['preco']",
+                        "campos_validos": ["prod_id", "prod_name", "prod_price", "prod_stock"]
+                    }
+                }
+            }
+        },
         401: {
             "description": "Erro ao buscar produtos.",
             "content": {
@@ -64,11 +81,13 @@ def products_get(
     availability: Union[bool | None] = Query(None, alias="availability", example=True),
     num_page: Union[int | None] = Query(1, alias="num_page"),
     limit: Annotated[int, Query(le=10)] = 10,
+    fields: Union[str | None] = Query(None, alias="fields", example="prod_id,prod_name,prod_price,prod_stock"),
     current_user: User = Depends(require_user_type([]))
 ):
     offset = (num_page - 1) * limit
     
-    query = select(Product)
+    columns = model_columns(Product, fields)
+    query = select(*columns).where(Product.prod_active == True)
 
     if category:
         query = query.where(Product.prod_cat == category.lower())
@@ -84,7 +103,7 @@ def products_get(
 
     results = session.exec(query.offset(offset).limit(limit)).all()
     
-    return results
+    return json_rows(results, columns)
 
 
 
@@ -225,6 +244,73 @@ def products_post(
 
 
 
+@router.get("/products/reservations", 
+    summary="Métricas de estoque reservado", 
+    response_description="Estoque reservado por pedidos em andamento e estoque disponível.",  
+    description="Retorna o total de unidades reservadas por pedidos aguardando pagamento e o total disponível para venda, com o detalhamento por produto reservado. O estoque disponível já desconta as reservas.",
+    responses={
+        200: {
+            "description": "Métricas de estoque.",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "reserved": 3,
+                        "available": 120,
+                        "products": [
+                            {"prod_id": 1, "prod_name": "Blusa Branca", "prod_stock": 7, "reserved": 3}
+                        ]
+                    }
+                }
+            }
+        },
+        401: {
+            "description": "Erro ao resgatar métricas de estoque.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Erro ao resgatar métricas de estoque."}
+                }
+            }
+        }
+    }
+)
+def products_reservations_get(
+    session: SessionDep,
+    product: Union[int | None] = Query(None, alias="product", example=1),
+    current_user: User = Depends(require_user_type(["administrador", "gerente", "estoquista"]))
+):
+    try:
+        reserved = (
+            select(
+                Product.prod_id, 
+                Product.prod_name, 
+                Product.prod_stock, 
+                func.sum(StockReservation.res_qty).label("reserved")
+            )
+            .join(StockReservation, StockReservation.res_prod == Product.prod_id)
+            .where(StockReservation.res_active == True)
+            .group_by(Product.prod_id)
+            .order_by(Product.prod_id)
+        )
+        available = select(func.coalesce(func.sum(Product.prod_stock), 0)).where(Product.prod_active == True)
+        
+        if product:
+            reserved = reserved.where(Product.prod_id == product)
+            available = available.where(Product.prod_id == product)
+        
+        products = [dict(row._mapping) for row in session.exec(reserved).all()]
+        
+        return {
+            "reserved": sum(p["reserved"] for p in products),
+            "available": session.exec(available).one(),
+            "products": products
+        }
+    except Exception as e:
+        sentry_sdk.capture_exception(e)
+        raise HTTPException(status_code=401, detail="Erro ao resgatar métricas de estoque.")
+
+
+
+
 @router.get("/products/{id}", 
     response_model=Product, 
     summary="Obtém detalhes de um produto", 
@@ -282,11 +368,14 @@ def products_get(
     
         product = session.get(Product, id)
         
-        if not product:
+        if not product or not product.prod_active:
             raise HTTPException(status_code=404, detail="Não foi possível encontrar este produto")
         
         return product
     
+    except HTTPException:
+        raise
+    
     except Exception as e:
         sentry_sdk.capture_exception(e)
         raise HTTPException(status_code=401, detail="Erro ao resgatar produto.")
@@ -342,6 +431,14 @@ def products_get(
                 }
             }
         },
+        409: {
+            "description": "Conflito com outra operação simultânea.",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Conflito com outra operação simultânea, tente novamente."}
+                }
+            }
+        },
         401: {
             "description": "Erro ao editar produto.",
             "content": {
@@ -359,12 +456,9 @@ def products_put(
     current_user: User = Depends(require_user_type(["administrador", "gerente", "estoquista"])),
     id: int = Path(..., example=1, description="ID do produto")
 ):
+    new_imgs = []
+    
     try: 
-        product = session.get(Product, id)
-
-        if not product:
-            raise HTTPException(status_code=404, detail="Não foi possível encontrar este produto.")
-
         update_data = json.loads(data)
 
         if "prod_size" in update_data:
@@ -395,28 +489,52 @@ def products_put(
                     "tipos_validos": VALID_SECTION_TYPES
                 })
 
+        # imagens gravadas uma única vez, fora das tentativas; as antigas só saem depois do commit
         if files:
-            handle_delete_images(product)
-            handle_upload_images(product, files)
+            new_imgs = save_image_files(files)
 
-        for key, value in update_data.items():
-            setattr(product, key, value)
+        for attempt in transaction_attempts(session, "products_put"):
+            with attempt:
+                # mesma trava de pedidos e devoluções: uma alteração de estoque concorrente não se perde
+                products = lock_products(session, [id])
 
-        session.add(product)
-        session.commit()
-        session.refresh(product)
+                if not products:
+                    raise HTTPException(status_code=404, detail="Não foi possível encontrar este produto.")
 
-        return product
+                product = products[0]
+                old_imgs = list(product.prod_imgs or [])
+
+                for key, value in update_data.items():
+                    setattr(product, key, value)
+
+                if files:
+                    product.prod_imgs = list(new_imgs)
+
+                session.add(product)
+                publish_events(session, [product_event(product)])
+                session.commit()
+                session.refresh(product)
+                new_imgs = []
+
+                if files:
+                    delete_image_files(old_imgs)
+
+                return product
+    except HTTPException:
+        raise
     except Exception as e:
         sentry_sdk.capture_exception(e)
         raise HTTPException(status_code=401, detail="Erro ao editar produto.")
+    finally:
+        # imagens de uma alteração que não foi confirmada
+        delete_image_files(new_imgs)
 
 
 
 @router.delete("/products/{id}", 
     summary="Remove um produto", 
     response_description="Produto removido com sucesso.", 
-    description="Remove um produto do sistema, incluindo suas imagens. Apenas administradores ou gerentes podem realizar esta ação.",
+    description="Remove um produto do sistema. A remoção é lógica e imediata; o produto e suas imagens são expurgados depois por um processo em segundo plano, caso não conste em nenhum pedido. Apenas administradores ou gerentes podem realizar esta ação.",
     responses={
         200: {
             "description": "Produto removido com sucesso.",
@@ -450,18 +568,25 @@ def products_delete(
     id: int = Path(..., example=1, description="ID do produto")
 ):
     try: 
-        product = session.get(Product, id)
+        # remoção lógica; imagens e linha são apagadas depois pelo expurgo em segundo plano
+        product = session.execute(
+            update(Product)
+            .where(Product.prod_id == id, Product.prod_active == True)
+            .values(prod_active=False, prod_deletedat=datetime.utcnow())
+            .returning(Product.prod_id, Product.prod_stock, Product.prod_section)
+        ).first()
         
         if not product:
             raise HTTPException(status_code=404, detail="Não foi possível encontrar este produto")
         
-        handle_delete_images(product)
-        
-        session.delete(product)
+        publish_events(session, [product_event(product, deleted=True)])
         session.commit()
         
         return {"ok": True}
     
+    except HTTPException:
+        raise
+    
     except Exception as e:
         sentry_sdk.capture_exception(e)
         raise HTTPException(status_code=401, detail="Erro ao deletar produto.")
@@ -525,7 +650,7 @@ def update_product_images(
 ):
     try:
         product = session.get(Product, id)
-        if not product:
+        if not product or not product.prod_active:
             raise HTTPException(status_code=404, detail="Produto não encontrado.")
 
         images_dir = os.path.join("static", "product_images")
@@ -616,7 +741,7 @@ def upload_product_image(
 ):
     try:
         product = session.get(Product, id)
-        if not product:
+        if not product or not product.prod_active:
             raise HTTPException(status_code=404, detail="Produto não encontrado.")
 
         images_dir = os.path.join("static", "product_images")
@@ -706,7 +831,7 @@ def delete_product_image(
 ):
     try:
         product = session.get(Product, id)
-        if not product:
+        if not product or not product.prod_active:
             raise HTTPException(status_code=404, detail="Produto não encontrado.")
 
         image_path = f"/static/product_images/{filename}"
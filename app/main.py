@@ -1,6 +1,6 @@
 from fastapi import FastAPI
-import sentry_sdk
-from app.endpoints import api_client, api_order, api_product, api_user
+import sentry_sdk, asyncio, os
+from app.endpoints import api_client, api_order, api_product, api_user, api_analytics, api_event, api_metrics
 from app.models.model_user import User
 from app.models.model_client import Client
 from app.models.model_product import Product
@@ -8,11 +8,20 @@ from app.models.model_order import Order
 from app.utils.database import get_db
 from contextlib import asynccontextmanager
 from app.utils.database import create_tables
+from app.utils.reservations import reservation_sweeper
+from app.utils.events import listen_events
+from app.utils.outbox import outbox_relay
+from app.utils.partitions import partition_maintainer
+from app.utils.autocomplete import client_names
+from app.utils.purge import purge_worker
+from app.utils.metrics import MetricsMiddleware, metrics_writer
+from app.utils.compression import CompressionMiddleware
+from fastapi.concurrency import run_in_threadpool
 
 sentry_sdk.init(
     dsn="https://1bb6b62726383444e29c95c0143c4206@o4509390158495744.ingest.us.sentry.io/4509390159806465",
     send_default_pii=True,
-#     traces_sample_rate=1.0,  # coleta de performance
+    traces_sample_rate=float(os.getenv("SENTRY_TRACES_SAMPLE_RATE", "0")),  # coleta de performance
 #     environment="production",  # ou "development"
 )
 
@@ -86,7 +95,33 @@ async def lifespan(app: FastAPI):
     yield
 
 
-app = FastAPI()
+@asynccontextmanager
+async def workers_lifespan(app: FastAPI):
+    await run_in_threadpool(client_names.refresh, True)
+    workers = [
+        asyncio.create_task(reservation_sweeper()),
+        asyncio.create_task(listen_events()),
+        asyncio.create_task(outbox_relay()),
+        asyncio.create_task(partition_maintainer()),
+        asyncio.create_task(purge_worker()),
+        asyncio.create_task(metrics_writer()),
+    ]
+    try:
+        yield
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+app = FastAPI(lifespan=workers_lifespan)
+
+
+app.add_middleware(MetricsMiddleware)
+
+
+# adicionado por último, envolve os demais: comprime o corpo final com os cabeçalhos já definidos
+app.add_middleware(CompressionMiddleware)
 
 
 
@@ -121,3 +156,6 @@ app.include_router(api_client.router)
 app.include_router(api_order.router)
 app.include_router(api_product.router)
 app.include_router(api_user.router)
+app.include_router(api_analytics.router)
+app.include_router(api_event.router)
+app.include_router(api_metrics.router)
@@ -1,12 +1,13 @@
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index, text
 from datetime import datetime
 from typing import Union
 
 
 class ClientBase(SQLModel):
-    cli_name: str = Field(min_length=10,max_length=30,index=True)
-    cli_email: str = Field(min_length=10,max_length=25,index=True, regex=r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
-    cli_cpf: str = Field(min_length=11,max_length=14,index=True)
+    cli_name: str = Field(min_length=10,max_length=30)
+    cli_email: str = Field(min_length=10,max_length=25, regex=r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+    cli_cpf: str = Field(min_length=11,max_length=14)
     cli_phone: str = Field(min_length=11,max_length=15)
     cli_address: Union[str, None] = Field(min_length=6,max_length=100)
         
@@ -50,6 +51,27 @@ class ClientUpdate(SQLModel):
 
 
 class Client(ClientBase, table=True):
+    # busca por trecho (LIKE '%...%') e por similaridade, sem acentos e sem diferenciar maiúsculas
+    __table_args__ = (
+        Index(
+            "ix_client_cli_name_trgm",
+            text("immutable_unaccent(lower(cli_name)) gin_trgm_ops"),
+            postgresql_using="gin",
+            postgresql_where=text("cli_active"),
+        ),
+        Index(
+            "ix_client_cli_email_trgm",
+            text("immutable_unaccent(lower(cli_email)) gin_trgm_ops"),
+            postgresql_using="gin",
+            postgresql_where=text("cli_active"),
+        ),
+        # clientes removidos (cli_active = false) ficam fora dos índices e liberam email e CPF
+        Index("ux_client_cli_cpf", "cli_cpf", unique=True, postgresql_where=text("cli_active")),
+        Index("ux_client_cli_email_lower", text("lower(cli_email)"), unique=True, postgresql_where=text("cli_active")),
+        Index("ix_client_cli_deletedat", "cli_deletedat", postgresql_where=text("NOT cli_active")),
+    )
+
     cli_id: int = Field(default=None, primary_key=True)
     cli_createdat: Union[datetime, None] = Field(default=datetime.utcnow())
-    cli_active: bool = Field(default=True)
\ No newline at end of file
+    cli_active: bool = Field(default=True)
+    cli_deletedat: Union[datetime, None] = Field(default=None)
\ No newline at end of file
@@ -0,0 +1,17 @@
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Column
+from sqlalchemy.dialects.postgresql import JSONB
+from datetime import datetime
+from typing import Union
+
+
+class IdempotencyKey(SQLModel, table=True):
+    idem_key: str = Field(primary_key=True, max_length=255)
+    idem_user: int = Field(primary_key=True)
+    idem_route: str = Field(primary_key=True, max_length=50)
+    idem_hash: str = Field(max_length=64)
+    idem_response: Union[dict, None] = Field(default=None, sa_column=Column(JSONB))
+    idem_createdat: datetime = Field(default_factory=datetime.utcnow)
+    idem_expiresat: datetime = Field(index=True)
+    
+    
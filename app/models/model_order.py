@@ -1,20 +1,22 @@
-from sqlmodel import SQLModel, Field, JSON
-from sqlalchemy import Column, DateTime
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Column, DateTime, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Union
 from ..utils.custom_types import SectionType, StatusType, PaymentType
 
 
 class OrderBase(SQLModel):
     order_section: SectionType
-    order_cli: int = Field(index=True)
+    order_cli: int
     order_total: float
     order_typepay: PaymentType
     order_address: str = Field(min_length=8,max_length=100)
-    order_prods: List[int] = Field(default_factory=list, sa_column=Column(JSON))
+    order_prods: List[int] = Field(default_factory=list, sa_column=Column(JSONB))
     
     
 class OrderCreate(OrderBase):
+    order_total: Optional[float] = None
     model_config = {
         "json_schema_extra": {
             "examples": [
@@ -45,17 +47,69 @@ class OrderUpdate(SQLModel):
     }
 
 
+class OrderBulkStatus(SQLModel):
+    order_status: StatusType
+    order_ids: Union[List[int], None] = Field(default=None, max_length=5000)
+    filter_status: Union[StatusType, None] = None
+    filter_section: Union[SectionType, None] = None
+    filter_client: Union[int, None] = None
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {
+                    "order_status": "a caminho",
+                    "order_ids": [1, 2, 3]
+                },
+                {
+                    "order_status": "a caminho",
+                    "filter_status": "preparando para a entrega",
+                    "filter_section": "blusas"
+                }
+            ]
+        }
+    }
+
+
 class Order(OrderBase, table=True):
-    order_id: Optional[int] = Field(primary_key=True, index=True)
+    # jsonb_path_ops: índice GIN menor, suficiente para consultas de contenção (@>)
+    __table_args__ = (
+        Index(
+            "ix_order_order_prods_gin",
+            "order_prods",
+            postgresql_using="gin",
+            postgresql_ops={"order_prods": "jsonb_path_ops"},
+        ),
+        # pedidos só são inseridos em ordem cronológica: BRIN cobre faixas de datas com poucas páginas
+        Index("ix_order_order_createdat_brin", "order_createdat", postgresql_using="brin"),
+        Index("ix_order_status_section_createdat", "order_status", "order_section", "order_createdat"),
+        # histórico do cliente (mais recentes primeiro) resolvido só com o índice
+        Index(
+            "ix_order_cli_createdat",
+            "order_cli",
+            text("order_createdat DESC"),
+            text("order_id DESC"),
+            postgresql_include=["order_total", "order_status"],
+        ),
+        # particionado por mês: a chave de partição precisa fazer parte da chave primária
+        {"postgresql_partition_by": "RANGE (order_createdat)"},
+    )
+
+    order_id: Optional[int] = Field(
+        default=None, 
+        primary_key=True, 
+        sa_column_kwargs={"autoincrement": True}
+    )
     order_period: Optional[datetime] = Field(
-        default_factory=datetime.utcnow(),
-        sa_column=Column(DateTime, index=True, default=datetime.utcnow())
+        default_factory=datetime.utcnow,
+        sa_column=Column(DateTime, default=datetime.utcnow)
     )
     
     order_createdat: Optional[datetime] = Field(
-        default_factory=datetime.utcnow(),
-        sa_column=Column(DateTime, index=True, default=datetime.utcnow())
+        default_factory=datetime.utcnow,
+        sa_column=Column(DateTime, primary_key=True, default=datetime.utcnow)
     )
     order_status: StatusType
+    order_items: List[dict] = Field(default_factory=list, sa_column=Column(JSONB))
+    order_restocked: bool = Field(default=False)
     
     
\ No newline at end of file
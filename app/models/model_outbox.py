@@ -0,0 +1,20 @@
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Column, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
+from datetime import datetime
+
+
+class OutboxEvent(SQLModel, table=True):
+    # o relay só procura eventos pendentes, em ordem de id
+    __table_args__ = (
+        Index("ix_outboxevent_pending", "evt_id", postgresql_where=text("NOT evt_published")),
+    )
+
+    evt_id: int = Field(default=None, primary_key=True)
+    evt_type: str = Field(max_length=30)
+    evt_key: int
+    evt_payload: dict = Field(sa_column=Column(JSONB, nullable=False))
+    evt_createdat: datetime = Field(default_factory=datetime.utcnow)
+    evt_published: bool = Field(default=False)
+    
+    
@@ -1,18 +1,18 @@
 from sqlmodel import SQLModel, Field, JSON
-from sqlalchemy import Column
+from sqlalchemy import Column, Index, text
 from datetime import datetime
 from typing import List, Union
 
 
 class ProductBase(SQLModel):
     prod_cat: str
-    prod_price: float = Field(index=True)
+    prod_price: float
     prod_desc: Union[str, None] = Field(default=None, max_length=100)
     prod_barcode: str = Field(min_length=13,max_length=43)
     prod_section: str
     prod_initialstock: Union[int | None] = Field(default=0, gt=-1)
     prod_dtval: Union[datetime | None] = Field(default=None)
-    prod_name: str = Field(min_length=3,max_length=50,index=True)
+    prod_name: str = Field(min_length=3,max_length=50)
     prod_size: List[str] = Field(default_factory=list, sa_column=Column(JSON))
     prod_color: List[str] = Field(default_factory=list, sa_column=Column(JSON))
     prod_imgs: List[str] | None = Field(default_factory=list, sa_column=Column(JSON))
@@ -35,9 +35,18 @@ class ProductUpdate(SQLModel):
 
 
 class Product(ProductBase, table=True):
+    # índices parciais: listagens só percorrem produtos ativos
+    __table_args__ = (
+        Index("ix_product_prod_price_active", "prod_price", postgresql_where=text("prod_active")),
+        Index("ix_product_prod_name_active", "prod_name", postgresql_where=text("prod_active")),
+        Index("ix_product_prod_deletedat", "prod_deletedat", postgresql_where=text("NOT prod_active")),
+    )
+
     prod_id: int = Field(default=None, primary_key=True)
     prod_createdat: datetime = Field(default=datetime.utcnow())
     prod_lastupdate: datetime = Field(default=datetime.utcnow())
     prod_stock: int = Field(default=0, gt=-1)
+    prod_active: bool = Field(default=True)
+    prod_deletedat: Union[datetime | None] = Field(default=None)
     
     
\ No newline at end of file
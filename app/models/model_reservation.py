@@ -0,0 +1,19 @@
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Index, text
+from datetime import datetime
+
+
+class StockReservation(SQLModel, table=True):
+    # o varredor só olha reservas ativas, então o índice ignora as já liberadas
+    __table_args__ = (
+        Index("ix_stockreservation_active_expiresat", "res_expiresat", postgresql_where=text("res_active")),
+    )
+
+    res_id: int = Field(default=None, primary_key=True)
+    res_order: int = Field(index=True)
+    res_prod: int = Field(index=True)
+    res_qty: int = Field(gt=0)
+    res_expiresat: datetime
+    res_active: bool = Field(default=True)
+    
+    
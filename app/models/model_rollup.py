@@ -0,0 +1,13 @@
+from sqlmodel import SQLModel, Field
+from datetime import date
+
+
+class SalesRollup(SQLModel, table=True):
+    roll_day: date = Field(primary_key=True)
+    roll_section: str = Field(primary_key=True, max_length=20)
+    roll_typepay: str = Field(primary_key=True, max_length=20)
+    roll_status: str = Field(primary_key=True, max_length=30)
+    roll_orders: int = Field(default=0)
+    roll_revenue: float = Field(default=0)
+    
+    
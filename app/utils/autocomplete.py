@@ -0,0 +1,163 @@
+import threading, unicodedata
+import sentry_sdk
+from bisect import bisect_left, insort
+from sqlmodel import Session, select
+from ..models.model_client import Client
+from .database import engine
+
+
+
+AUTOCOMPLETE_LIMIT = 20
+
+
+
+def normalize_name(value):
+    value = unicodedata.normalize("NFKD", value or "")
+    value = "".join(char for char in value if not unicodedata.combining(char))
+    return " ".join(value.lower().split())
+
+
+
+def name_keys(normalized):
+    # uma chave por palavra: "silva" também encontra "joão da silva"
+    words = normalized.split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+
+class PrefixIndex:
+    def __init__(self):
+        self.keys = []
+        self.names = {}
+        self.ready = False
+        self.loaded = False
+        self.generation = 0
+        # alterações recebidas enquanto uma reconstrução lê o banco (None fora dela)
+        self.changes = None
+        self.lock = threading.Lock()
+        self.rebuild_lock = threading.Lock()
+
+    def build(self, rows, generation=None):
+        keys, names = [], {}
+        for cli_id, name in rows:
+            normalized = normalize_name(name)
+            names[cli_id] = (normalized, name)
+            keys.extend((key, cli_id) for key in name_keys(normalized))
+        keys.sort()
+
+        with self.lock:
+            self.keys, self.names = keys, names
+            # o snapshot do banco pode não ter o que chegou durante a leitura
+            for cli_id, name in self.changes or []:
+                self._remove(cli_id)
+                if name is not None:
+                    self._add(cli_id, name)
+            self.changes = None
+            # invalidado de novo durante a leitura: continua pendente
+            self.ready = generation is None or generation == self.generation
+            self.loaded = True
+
+    def fetch_names(self):
+        with Session(engine) as session:
+            return session.exec(select(Client.cli_id, Client.cli_name).where(Client.cli_active == True)).all()
+
+    def load(self):
+        with self.lock:
+            generation = self.generation
+            self.changes = []
+
+        try:
+            rows = self.fetch_names()
+        except Exception:
+            with self.lock:
+                self.changes = None
+            raise
+
+        self.build(rows, generation)
+
+    def refresh(self, wait=False):
+        # single-flight: uma reconstrução por vez
+        if wait:
+            with self.rebuild_lock:
+                if not self.ready:
+                    self.load()
+            return
+
+        # sem esperar: a busca segue com o índice antigo enquanto outra thread reconstrói
+        if not self.rebuild_lock.locked():
+            threading.Thread(target=self.refresh_in_background, daemon=True).start()
+
+    def refresh_in_background(self):
+        if not self.rebuild_lock.acquire(blocking=False):
+            return
+
+        try:
+            if not self.ready:
+                self.load()
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+        finally:
+            self.rebuild_lock.release()
+
+    def _remove(self, cli_id):
+        entry = self.names.pop(cli_id, None)
+        if entry is None:
+            return
+        for key in name_keys(entry[0]):
+            i = bisect_left(self.keys, (key, cli_id))
+            if i < len(self.keys) and self.keys[i] == (key, cli_id):
+                del self.keys[i]
+
+    def _add(self, cli_id, name):
+        normalized = normalize_name(name)
+        self._remove(cli_id)
+        self.names[cli_id] = (normalized, name)
+        for key in name_keys(normalized):
+            insort(self.keys, (key, cli_id))
+
+    def add(self, cli_id, name):
+        with self.lock:
+            self._add(cli_id, name)
+            if self.changes is not None:
+                self.changes.append((cli_id, name))
+
+    def remove(self, cli_id):
+        with self.lock:
+            self._remove(cli_id)
+            if self.changes is not None:
+                self.changes.append((cli_id, None))
+
+    def invalidate(self):
+        with self.lock:
+            self.ready = False
+            self.generation += 1
+
+    def apply(self, event):
+        if event.get("rebuild"):
+            self.invalidate()
+        elif event.get("deleted"):
+            self.remove(event["cli_id"])
+        else:
+            self.add(event["cli_id"], event["cli_name"])
+
+    def search(self, prefix, limit=AUTOCOMPLETE_LIMIT):
+        if not self.ready:
+            # só a primeira carga bloqueia a busca
+            self.refresh(wait=not self.loaded)
+
+        prefix = normalize_name(prefix)
+        results = {}
+
+        with self.lock:
+            i = bisect_left(self.keys, (prefix,))
+            while i < len(self.keys) and len(results) < limit:
+                key, cli_id = self.keys[i]
+                if not key.startswith(prefix):
+                    break
+                results.setdefault(cli_id, self.names[cli_id][1])
+                i += 1
+
+        return [{"cli_id": cli_id, "cli_name": name} for cli_id, name in results.items()]
+
+
+client_names = PrefixIndex()
@@ -0,0 +1,157 @@
+import csv, io, json, re
+from collections import Counter
+from pydantic import ValidationError
+from sqlalchemy import text
+from ..models.model_client import ClientCreate
+
+
+
+CLIENT_IMPORT_BATCH = 5000
+# o relatório traz só as linhas não inseridas, até este limite; os totais cobrem o arquivo inteiro
+CLIENT_IMPORT_REPORT_LIMIT = 1000
+CLIENT_IMPORT_COLUMNS = ["cli_name", "cli_email", "cli_cpf", "cli_phone", "cli_address"]
+# o regex do Field no modelo não é aplicado pelo pydantic v2
+EMAIL_REGEX = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+
+
+def read_import_rows(file, file_format):
+    stream = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+
+    if file_format == "csv":
+        # linha 1 é o cabeçalho; campos vazios viram nulos
+        for line, row in enumerate(csv.DictReader(stream), start=2):
+            yield line, {key: value or None for key, value in row.items() if key}
+        return
+
+    for line, raw in enumerate(stream, start=1):
+        if not raw.strip():
+            continue
+        try:
+            row = json.loads(raw)
+        except json.JSONDecodeError:
+            row = None
+        yield line, row if isinstance(row, dict) else None
+
+
+
+def normalize_import_row(row):
+    if row is None:
+        raise ValueError("Linha inválida.")
+
+    client = ClientCreate.model_validate(row)
+    client.cli_phone = re.sub(r'\D', '', client.cli_phone)
+    client.cli_cpf = re.sub(r'\D', '', client.cli_cpf)
+
+    if len(client.cli_cpf) != 11:
+        raise ValueError("CPF inválido.")
+
+    if not EMAIL_REGEX.match(client.cli_email):
+        raise ValueError("Email inválido.")
+
+    return client
+
+
+
+def load_import_batch(session, batch):
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS client_import "
+            "(line int, cli_name text, cli_email text, cli_cpf text, cli_phone text, cli_address text) "
+            "ON COMMIT DELETE ROWS"
+        )
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for line, client in batch:
+            writer.writerow([line] + [getattr(client, column) for column in CLIENT_IMPORT_COLUMNS])
+        buffer.seek(0)
+
+        cursor.copy_expert("COPY client_import FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+    # anti-join contra a tabela de clientes; ON CONFLICT cobre cadastros concorrentes
+    inserted = session.execute(text("""
+        INSERT INTO client (cli_name, cli_email, cli_cpf, cli_phone, cli_address, cli_createdat, cli_active)
+        SELECT i.cli_name, i.cli_email, i.cli_cpf, i.cli_phone, i.cli_address, now() AT TIME ZONE 'utc', true
+        FROM client_import i
+        WHERE NOT EXISTS (SELECT 1 FROM client c WHERE c.cli_cpf = i.cli_cpf AND c.cli_active)
+          AND NOT EXISTS (SELECT 1 FROM client c WHERE lower(c.cli_email) = lower(i.cli_email) AND c.cli_active)
+        ORDER BY i.line
+        ON CONFLICT DO NOTHING
+        RETURNING cli_id, cli_cpf
+    """)).all()
+
+    return {cpf: cli_id for cli_id, cpf in inserted}
+
+
+
+def report_row(rows, summary, row):
+    summary[row["status"]] += 1
+
+    if row["status"] != "inserido" and len(rows) < CLIENT_IMPORT_REPORT_LIMIT:
+        rows.append(row)
+
+
+
+def flush_import_batch(session, batch, rows, summary):
+    if not batch:
+        return
+
+    inserted = load_import_batch(session, batch)
+    session.commit()
+
+    for line, client in batch:
+        if client.cli_cpf in inserted:
+            report_row(rows, summary, {"line": line, "status": "inserido"})
+        else:
+            report_row(rows, summary, {"line": line, "status": "duplicado", "detail": "Cliente já cadastrado com este CPF ou email."})
+
+    batch.clear()
+
+
+
+def import_clients(session, file, file_format, batch_size=CLIENT_IMPORT_BATCH):
+    rows, batch = [], []
+    summary = Counter()
+    seen_cpfs, seen_emails = set(), set()
+
+    for line, row in read_import_rows(file, file_format):
+        try:
+            client = normalize_import_row(row)
+        except ValidationError as e:
+            error = e.errors()[0]
+            field = ".".join(str(loc) for loc in error["loc"])
+            report_row(rows, summary, {"line": line, "status": "invalido", "detail": f"{field}: {error['msg']}"})
+            continue
+        except ValueError as e:
+            report_row(rows, summary, {"line": line, "status": "invalido", "detail": str(e)})
+            continue
+
+        email = client.cli_email.lower()
+
+        if client.cli_cpf in seen_cpfs or email in seen_emails:
+            report_row(rows, summary, {"line": line, "status": "duplicado_arquivo", "detail": "CPF ou email repetido no arquivo."})
+            continue
+
+        seen_cpfs.add(client.cli_cpf)
+        seen_emails.add(email)
+        batch.append((line, client))
+
+        if len(batch) >= batch_size:
+            flush_import_batch(session, batch, rows, summary)
+
+    flush_import_batch(session, batch, rows, summary)
+    rows.sort(key=lambda row: row["line"])
+
+    return {
+        "total": sum(summary.values()),
+        "inserido": summary["inserido"],
+        "duplicado": summary["duplicado"],
+        "duplicado_arquivo": summary["duplicado_arquivo"],
+        "invalido": summary["invalido"],
+        "rows": rows,
+        "rows_truncated": sum(summary.values()) - summary["inserido"] > len(rows),
+    }
@@ -0,0 +1,39 @@
+from sqlmodel import select
+from sqlalchemy import func, case
+from ..models.model_order import Order
+from .cache import client_summaries
+from .custom_types import RESTOCK_STATUS_TYPES
+
+
+
+def client_orders_summary(session, client_id):
+    cached = client_summaries.get(client_id)
+    
+    if cached is not None:
+        return cached
+    
+    # pedidos cancelados ou reembolsados não entram no valor total do cliente
+    count, lifetime_value, last_order = session.exec(
+        select(
+            func.count(Order.order_id),
+            func.coalesce(func.sum(
+                case((Order.order_status.in_(RESTOCK_STATUS_TYPES), 0), else_=Order.order_total)
+            ), 0),
+            func.max(Order.order_createdat),
+        ).where(Order.order_cli == client_id)
+    ).one()
+    
+    summary = {
+        "orders": count,
+        "lifetime_value": round(float(lifetime_value), 2),
+        "last_order": last_order,
+    }
+    client_summaries.set(client_id, summary)
+    
+    return summary
+
+
+
+def invalidate_client_summary(event):
+    if event.get("type") == "order":
+        client_summaries.invalidate(event.get("order_cli"))
@@ -0,0 +1,226 @@
+import hashlib, os, zlib
+from fastapi.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from .cache import TTLCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+# corpos maiores que isso são comprimidos no threadpool para não travar o event loop
+COMPRESSION_THREAD_SIZE = 256 * 1024
+COMPRESSION_CACHE_TTL_SECONDS = int(os.getenv("COMPRESSION_CACHE_TTL_SECONDS", "300"))
+COMPRESSION_CACHE_MAXSIZE = 256
+COMPRESSION_CACHE_MAX_BODY = 1024 * 1024
+
+COMPRESSIBLE_TYPES = ("application/json", "application/javascript", "application/xml", "image/svg+xml", "text/")
+# eventos SSE são pequenos e precisam chegar na hora; comprimir só atrasaria o keep-alive
+UNCOMPRESSED_TYPES = ("text/event-stream",)
+
+
+
+class GzipStream:
+    def __init__(self):
+        self.compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data, flush=True):
+        # flush a cada pedaço: o cliente descomprime o que já chegou sem esperar o fim
+        return self.compressor.compress(data) + (self.compressor.flush(zlib.Z_SYNC_FLUSH) if flush else b"")
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+
+class BrotliStream:
+    def __init__(self):
+        self.compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+
+    def compress(self, data, flush=True):
+        return self.compressor.process(data) + (self.compressor.flush() if flush else b"")
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+
+class ZstdStream:
+    def __init__(self):
+        self.compressor = zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compressobj()
+
+    def compress(self, data, flush=True):
+        return self.compressor.compress(data) + (self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK) if flush else b"")
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+
+# preferência do servidor em caso de empate: zstd e brotli comprimem melhor que gzip
+ENCODINGS = {"gzip": GzipStream}
+if brotli:
+    ENCODINGS = {"br": BrotliStream, **ENCODINGS}
+if zstandard:
+    ENCODINGS = {"zstd": ZstdStream, **ENCODINGS}
+
+compressed_bodies = TTLCache(COMPRESSION_CACHE_TTL_SECONDS, COMPRESSION_CACHE_MAXSIZE)
+
+
+
+def negotiate_encoding(accept_encoding):
+    weights = {}
+
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+
+        weight = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+
+    wildcard = weights.get("*", 0.0)
+    candidates = [
+        (weights.get(coding, wildcard), -preference, coding)
+        for preference, coding in enumerate(ENCODINGS)
+    ]
+    weight, _, coding = max(candidates)
+
+    return coding if weight > 0 else None
+
+
+
+def compress_body(encoding, body):
+    stream = ENCODINGS[encoding]()
+    return stream.compress(body, flush=False) + stream.finish()
+
+
+
+async def cached_compress(encoding, body):
+    # listagens e detalhes de produto repetem o mesmo corpo entre requisições:
+    # o digest custa bem menos que comprimir de novo
+    key = None
+    if len(body) <= COMPRESSION_CACHE_MAX_BODY:
+        key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+        compressed = compressed_bodies.get(key)
+        if compressed is not None:
+            return compressed
+
+    if len(body) > COMPRESSION_THREAD_SIZE:
+        compressed = await run_in_threadpool(compress_body, encoding, body)
+    else:
+        compressed = compress_body(encoding, body)
+
+    if key:
+        compressed_bodies.set(key, compressed)
+
+    return compressed
+
+
+
+def compressible(headers):
+    media_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    return (
+        "content-encoding" not in headers
+        and media_type.startswith(COMPRESSIBLE_TYPES)
+        and not media_type.startswith(UNCOMPRESSED_TYPES)
+    )
+
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size=COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await CompressionResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+
+
+class CompressionResponder:
+    def __init__(self, app, encoding, minimum_size):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start = None
+        self.stream = None
+        self.passthrough = False
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message):
+        if message["type"] == "http.response.start":
+            # o cabeçalho só sai junto com o primeiro pedaço do corpo, quando já se sabe o tamanho
+            self.start = message
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start is not None:
+            start, self.start = self.start, None
+            headers = MutableHeaders(raw=start["headers"])
+
+            if not compressible(headers) or (not more_body and len(body) < self.minimum_size):
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+
+            if not more_body:
+                body = await cached_compress(self.encoding, body)
+                headers["Content-Length"] = str(len(body))
+                await self.send(start)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+
+            # resposta em streaming: tamanho final desconhecido, cada pedaço sai comprimido
+            if "content-length" in headers:
+                del headers["Content-Length"]
+            self.stream = ENCODINGS[self.encoding]()
+            await self.send(start)
+
+        if more_body:
+            body = self.stream.compress(body)
+        else:
+            body = self.stream.compress(body, flush=False) + self.stream.finish()
+
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
@@ -175,6 +175,7 @@ class StatusType(str, Enum):
     acaminho = "a caminho"
     cancelado = "cancelado"
     reembolso = "solicitado reembolso"
+    reembolsado = "reembolsado"
     
     @classmethod
     def _missing_(cls, value):
@@ -187,6 +188,23 @@ class StatusType(str, Enum):
 
 
 
+STATUS_TRANSITIONS = {
+    StatusType.andamento: {StatusType.pagamentook, StatusType.cancelado},
+    StatusType.pagamentook: {StatusType.preparando, StatusType.cancelado, StatusType.reembolso},
+    StatusType.preparando: {StatusType.enviado, StatusType.acaminho, StatusType.cancelado},
+    StatusType.enviado: {StatusType.acaminho, StatusType.entregue},
+    StatusType.acaminho: {StatusType.entregue},
+    StatusType.entregue: {StatusType.reembolso},
+    StatusType.reembolso: {StatusType.reembolsado},
+    StatusType.cancelado: set(),
+    StatusType.reembolsado: set(),
+}
+
+
+RESTOCK_STATUS_TYPES = {StatusType.cancelado, StatusType.reembolsado}
+
+
+
 VALID_PAYMENT_TYPES = [
     "crédito",
     "débito",
@@ -0,0 +1,170 @@
+import asyncio, json
+import sentry_sdk
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from .database import engine
+from .services import to_str_lower
+from .outbox import add_outbox_events, read_outbox_events
+from .client_summary import invalidate_client_summary
+from .autocomplete import client_names
+
+
+
+EVENTS_CHANNEL = "shop_events"
+EVENTS_QUEUE_SIZE = 100
+EVENTS_RECONNECT_SECONDS = 5
+
+
+
+def order_event(order, status=None):
+    return {
+        "type": "order",
+        "order_id": order.order_id,
+        "order_status": to_str_lower(status or order.order_status),
+        "order_section": to_str_lower(order.order_section),
+        "order_cli": order.order_cli,
+        "order_prods": sorted(set(order.order_prods or [])),
+    }
+
+
+
+def product_event(product, deleted=False):
+    return {
+        "type": "product",
+        "prod_id": product.prod_id,
+        "prod_stock": product.prod_stock,
+        "prod_section": to_str_lower(product.prod_section),
+        "deleted": deleted,
+    }
+
+
+
+def client_event(client, deleted=False):
+    return {
+        "type": "client",
+        "cli_id": client.cli_id,
+        "cli_name": client.cli_name,
+        "deleted": deleted,
+    }
+
+
+
+def notify_events(session, events):
+    # NOTIFY é transacional: os ouvintes só recebem os eventos depois do commit,
+    # e um rollback os descarta. Todos os eventos vão em uma única ida ao banco.
+    if not events:
+        return
+    
+    session.execute(
+        text("SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"),
+        {
+            "channel": EVENTS_CHANNEL,
+            "payloads": [json.dumps(event, default=str, ensure_ascii=False) for event in events],
+        }
+    )
+
+
+
+def publish_events(session, events):
+    # outbox (entrega garantida a consumidores externos) e NOTIFY (telas conectadas)
+    # gravados na mesma transação da alteração que os gerou; o NOTIFY leva só o id do
+    # evento, já que o payload pode passar do limite de 8000 bytes do canal
+    ids = add_outbox_events(session, events)
+    notify_events(session, [{"outbox": evt_id} for evt_id in ids])
+
+
+
+def event_matches(event, section=None, product=None, client=None):
+    if section and section not in (event.get("order_section"), event.get("prod_section")):
+        return False
+    
+    if product and product != event.get("prod_id") and product not in event.get("order_prods", []):
+        return False
+    
+    if client and client != event.get("order_cli"):
+        return False
+    
+    return True
+
+
+
+class EventBroker:
+    def __init__(self):
+        self.subscribers = {}
+
+    def subscribe(self, **filters):
+        queue = asyncio.Queue(maxsize=EVENTS_QUEUE_SIZE)
+        self.subscribers[queue] = filters
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.pop(queue, None)
+
+    def publish(self, event):
+        for queue, filters in list(self.subscribers.items()):
+            if event_matches(event, **filters):
+                try:
+                    queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    # assinante lento: descarta o evento em vez de segurar os demais
+                    pass
+
+
+broker = EventBroker()
+
+
+
+async def listen_events():
+    # um único LISTEN por worker alimenta todos os assinantes conectados a ele
+    loop = asyncio.get_running_loop()
+    
+    while True:
+        connection = None
+        try:
+            connection = await run_in_threadpool(engine.raw_connection)
+            connection.detach()
+            dbapi_connection = connection.driver_connection
+            dbapi_connection.autocommit = True
+            
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {EVENTS_CHANNEL}")
+            
+            readable = asyncio.Event()
+            loop.add_reader(dbapi_connection.fileno(), readable.set)
+            try:
+                while True:
+                    await readable.wait()
+                    readable.clear()
+                    dbapi_connection.poll()
+                    
+                    events = [json.loads(notify.payload) for notify in dbapi_connection.notifies]
+                    dbapi_connection.notifies.clear()
+                    
+                    # pedidos e produtos chegam só com o id: o conteúdo é lido da outbox, uma consulta por leitura
+                    outbox_ids = [event["outbox"] for event in events if "outbox" in event]
+                    stored = await run_in_threadpool(read_outbox_events, outbox_ids) if outbox_ids else {}
+                    
+                    for event in events:
+                        if "outbox" in event:
+                            event = stored.get(event["outbox"])
+                            if event is None:
+                                continue
+                        
+                        # eventos de cliente só mantêm o índice de autocomplete deste worker
+                        if event["type"] == "client":
+                            client_names.apply(event)
+                            continue
+                        
+                        invalidate_client_summary(event)
+                        broker.publish(event)
+            finally:
+                loop.remove_reader(dbapi_connection.fileno())
+                
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+            await asyncio.sleep(EVENTS_RECONNECT_SECONDS)
+        finally:
+            if connection is not None:
+                connection.close()
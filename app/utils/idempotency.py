@@ -0,0 +1,70 @@
+import hashlib, json
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlmodel import select
+from sqlalchemy import text, tuple_, delete
+from ..models.model_idempotency import IdempotencyKey
+
+
+
+IDEMPOTENCY_TTL_HOURS = 24
+IDEMPOTENCY_PURGE_BATCH = 100
+
+
+
+def request_hash(data):
+    payload = json.dumps(jsonable_encoder(data), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+
+def idempotency_lookup(session, key, user_id, route, payload_hash):
+    # trava transacional por chave: uma requisição concorrente com a mesma chave
+    # fica bloqueada aqui até a primeira terminar (commit ou rollback)
+    session.execute(
+        text("SELECT pg_advisory_xact_lock(hashtext(:lock_key))"),
+        {"lock_key": f"{route}:{user_id}:{key}"}
+    )
+
+    stored = session.get(IdempotencyKey, {"idem_key": key, "idem_user": user_id, "idem_route": route})
+
+    if not stored:
+        return None
+
+    if stored.idem_expiresat < datetime.utcnow():
+        session.delete(stored)
+        session.flush()
+        return None
+
+    if stored.idem_hash != payload_hash:
+        raise HTTPException(status_code=422, detail="Chave de idempotência já utilizada com outra requisição.")
+
+    return stored.idem_response
+
+
+
+def idempotency_save(session, key, user_id, route, payload_hash, response):
+    now = datetime.utcnow()
+
+    expired = (
+        select(IdempotencyKey.idem_key, IdempotencyKey.idem_user, IdempotencyKey.idem_route)
+        .where(IdempotencyKey.idem_expiresat < now)
+        .limit(IDEMPOTENCY_PURGE_BATCH)
+        .with_for_update(skip_locked=True)
+    )
+    session.execute(
+        delete(IdempotencyKey).where(
+            tuple_(IdempotencyKey.idem_key, IdempotencyKey.idem_user, IdempotencyKey.idem_route).in_(expired)
+        ).execution_options(synchronize_session=False)
+    )
+
+    session.add(IdempotencyKey(
+        idem_key=key,
+        idem_user=user_id,
+        idem_route=route,
+        idem_hash=payload_hash,
+        idem_response=jsonable_encoder(response),
+        idem_createdat=now,
+        idem_expiresat=now + timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+    ))
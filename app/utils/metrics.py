@@ -0,0 +1,346 @@
+import asyncio, fcntl, glob, json, os, threading, time
+import sentry_sdk
+import anyio.to_thread
+from bisect import bisect_left
+from starlette.datastructures import MutableHeaders
+from .cache import client_summaries
+from .compression import compressed_bodies
+from .database import engine, RequestStats, current_request, repeated_statements, sql_logger
+from .retry import transaction_metrics
+
+
+
+# com vários workers (uvicorn --workers, gunicorn), cada processo grava seu snapshot
+# neste diretório e o /metrics de qualquer worker soma todos eles
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_FLUSH_SECONDS = int(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+METRICS_STALE_SECONDS = int(os.getenv("METRICS_STALE_SECONDS", "60"))
+METRICS_RETIRED_FILE = "retired_metrics.json"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_HELP = {
+    "http_request_duration_seconds": ("histogram", "Duração das requisições HTTP por rota e status."),
+    "http_requests_in_flight": ("gauge", "Requisições HTTP em andamento."),
+    "db_queries_total": ("counter", "Instruções SQL executadas por rota."),
+    "db_query_seconds_total": ("counter", "Tempo gasto em instruções SQL por rota."),
+    "db_n_plus_one_total": ("counter", "Requisições que repetiram a mesma instrução SQL além do limite (possível N+1)."),
+    "db_transactions_total": ("counter", "Transações com retentativa por endpoint e resultado."),
+    "db_pool_size": ("gauge", "Tamanho configurado do pool de conexões."),
+    "db_pool_checked_out": ("gauge", "Conexões do pool em uso."),
+    "db_pool_overflow": ("gauge", "Conexões abertas além do tamanho do pool."),
+    "threadpool_tokens_total": ("gauge", "Capacidade do threadpool usado pelos endpoints síncronos."),
+    "threadpool_tokens_borrowed": ("gauge", "Threads do threadpool ocupadas."),
+    "cache_hits_total": ("counter", "Acertos de cache."),
+    "cache_misses_total": ("counter", "Faltas de cache."),
+    "cache_entries": ("gauge", "Entradas em cache."),
+}
+
+
+
+# pid + início do processo: um worker reiniciado que reaproveita o pid não
+# sobrescreve (e faz regredir) os contadores do worker que morreu
+_process_ids = {}
+
+def process_id():
+    pid = os.getpid()
+    if pid not in _process_ids:
+        _process_ids[pid] = f"{pid}-{time.time_ns()}"
+    return _process_ids[pid]
+
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.queries = {}
+        self.in_flight = 0
+
+    def start_request(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def observe_request(self, method, route, status, duration, stats):
+        bucket = bisect_left(LATENCY_BUCKETS, duration)
+        key = (method, route, str(status))
+        n_plus_one = 1 if repeated_statements(stats) else 0
+
+        # um único lock por requisição; os buckets são acumulados só na exposição
+        with self.lock:
+            self.in_flight -= 1
+            series = self.requests.get(key)
+            if series is None:
+                series = self.requests[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0, 0]
+            series[0][bucket] += 1
+            series[1] += duration
+            series[2] += 1
+            queries = self.queries.setdefault(route, [0, 0.0, 0])
+            queries[0] += stats.queries
+            queries[1] += stats.db_time
+            queries[2] += n_plus_one
+
+    def snapshot(self):
+        with self.lock:
+            histograms = [
+                ["http_request_duration_seconds", {"method": method, "route": route, "status": status}, list(buckets), total, count]
+                for (method, route, status), (buckets, total, count) in self.requests.items()
+            ]
+            counters = []
+            for route, (count, db_time, n_plus_one) in self.queries.items():
+                counters += [
+                    ["db_queries_total", {"route": route}, count],
+                    ["db_query_seconds_total", {"route": route}, db_time],
+                    ["db_n_plus_one_total", {"route": route}, n_plus_one],
+                ]
+            gauges = [["http_requests_in_flight", {}, self.in_flight]]
+
+        for name, stats in transaction_metrics().items():
+            counters += [["db_transactions_total", {"name": name, "outcome": outcome}, value] for outcome, value in stats.items()]
+
+        for name, cache in (("client_summary", client_summaries), ("compressed_body", compressed_bodies)):
+            stats = cache.stats()
+            counters += [
+                ["cache_hits_total", {"cache": name}, stats["hits"]],
+                ["cache_misses_total", {"cache": name}, stats["misses"]],
+            ]
+            gauges += [["cache_entries", {"cache": name}, stats["size"]]]
+
+        pool = engine.pool
+        if hasattr(pool, "checkedout"):
+            gauges += [
+                ["db_pool_size", {}, pool.size()],
+                ["db_pool_checked_out", {}, pool.checkedout()],
+                ["db_pool_overflow", {}, max(pool.overflow(), 0)],
+            ]
+
+        try:
+            limiter = anyio.to_thread.current_default_thread_limiter()
+            gauges += [
+                ["threadpool_tokens_total", {}, limiter.total_tokens],
+                ["threadpool_tokens_borrowed", {}, limiter.borrowed_tokens],
+            ]
+        except Exception:
+            # fora do event loop o limitador não está disponível
+            pass
+
+        return {
+            "process": process_id(),
+            "time": time.time(),
+            "histograms": histograms,
+            "counters": counters,
+            "gauges": gauges,
+        }
+
+
+registry = MetricsRegistry()
+
+
+
+def server_timing(stats, duration):
+    slowest = stats.slowest[0] * 1000
+    return (
+        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+        f'db-slowest;dur={slowest:.1f}, '
+        f'app;dur={duration * 1000:.1f}'
+    )
+
+
+
+def report_repeated_statements(method, stats):
+    for shape, count in repeated_statements(stats):
+        sql_logger.warning("Possível N+1 em %s %s: %d execuções de %s", method, stats.route, count, shape[:2000])
+
+
+
+class MetricsMiddleware:
+    # ASGI puro: o @app.middleware("http") reenvia todo corpo em pedaços (more_body=True),
+    # o que impedia a compressão de saber o tamanho final da resposta
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        registry.start_request()
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers["Server-Timing"] = server_timing(stats, time.perf_counter() - start)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            # rota declarada (/orders/{id}), não o caminho, para não explodir a cardinalidade
+            route = getattr(scope.get("route"), "path", "desconhecida")
+            registry.observe_request(scope["method"], route, status, time.perf_counter() - start, stats)
+            report_repeated_statements(scope["method"], stats)
+            current_request.reset(token)
+
+
+
+def write_snapshot(snapshot, path=None):
+    path = path or os.path.join(METRICS_DIR, f"metrics_{snapshot['process']}.json")
+    temp_path = f"{path}.tmp"
+
+    with open(temp_path, "w") as file:
+        json.dump(snapshot, file)
+    os.replace(temp_path, path)
+
+
+
+def load_snapshot(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+
+def merge_series(snapshots):
+    counters, histograms = {}, {}
+
+    for snapshot in snapshots:
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(sorted(labels.items())))
+            counters[key] = counters.get(key, 0) + value
+
+        for name, labels, buckets, total, count in snapshot["histograms"]:
+            key = (name, tuple(sorted(labels.items())))
+            merged = histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+            merged[1] += total
+            merged[2] += count
+
+    return counters, histograms
+
+
+
+def retire_snapshots(retired, stale):
+    # os contadores dos workers encerrados entram no acumulado antes de o arquivo
+    # deles ser removido, para que as séries do Prometheus nunca regridam
+    counters, histograms = merge_series([retired] + stale)
+
+    return {
+        "process": "retired",
+        "time": 0,
+        "counters": [[name, dict(labels), value] for (name, labels), value in counters.items()],
+        "histograms": [[name, dict(labels), *series] for (name, labels), series in histograms.items()],
+        "gauges": [],
+    }
+
+
+
+def collect_snapshots(now=None):
+    snapshot = registry.snapshot()
+
+    if not METRICS_DIR:
+        return [snapshot]
+
+    write_snapshot(snapshot)
+    now = now or time.time()
+    retired_path = os.path.join(METRICS_DIR, METRICS_RETIRED_FILE)
+
+    # uma coleta por vez: dois workers não podem somar o mesmo arquivo vencido
+    with open(os.path.join(METRICS_DIR, "metrics.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        snapshots, stale, stale_paths = [], [], []
+        for path in glob.glob(os.path.join(METRICS_DIR, "metrics_*.json")):
+            loaded = load_snapshot(path)
+            if loaded is None:
+                continue
+            if now - loaded["time"] > METRICS_STALE_SECONDS:
+                stale.append(loaded)
+                stale_paths.append(path)
+            else:
+                snapshots.append(loaded)
+
+        retired = load_snapshot(retired_path) or retire_snapshots({"counters": [], "histograms": []}, [])
+        if stale:
+            retired = retire_snapshots(retired, stale)
+            write_snapshot(retired, retired_path)
+            for path in stale_paths:
+                os.remove(path)
+
+    return snapshots + [retired]
+
+
+
+def label_text(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        f'{key}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+
+def render_metrics(snapshots, now=None):
+    now = now or time.time()
+    # contadores e histogramas somam entre processos, inclusive de workers já encerrados
+    counters, histograms = merge_series(snapshots)
+    gauges = {}
+
+    for snapshot in snapshots:
+        # gauges descrevem o estado atual: um valor por processo vivo
+        if now - snapshot["time"] > METRICS_STALE_SECONDS:
+            continue
+        for name, labels, value in snapshot["gauges"]:
+            key = (name, tuple(sorted({**labels, "process": snapshot["process"]}.items())))
+            gauges[key] = value
+
+    lines = []
+    for name, (kind, help_text) in METRIC_HELP.items():
+        series = counters if kind == "counter" else histograms if kind == "histogram" else gauges
+        keys = sorted(key for key in series if key[0] == name)
+
+        if not keys:
+            continue
+
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+        for key in keys:
+            labels = dict(key[1])
+
+            if kind != "histogram":
+                lines.append(f"{name}{label_text(labels)} {series[key]}")
+                continue
+
+            buckets, total, count = series[key]
+            cumulative = 0
+            for bound, value in zip(LATENCY_BUCKETS + ("+Inf",), buckets):
+                cumulative += value
+                lines.append(f"{name}_bucket{label_text({**labels, 'le': bound})} {cumulative}")
+            lines.append(f"{name}_sum{label_text(labels)} {total}")
+            lines.append(f"{name}_count{label_text(labels)} {count}")
+
+    return "\n".join(lines) + "\n"
+
+
+
+async def metrics_writer():
+    if not METRICS_DIR:
+        return
+
+    os.makedirs(METRICS_DIR, exist_ok=True)
+
+    while True:
+        try:
+            write_snapshot(registry.snapshot())
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+
+        await asyncio.sleep(METRICS_FLUSH_SECONDS)
@@ -0,0 +1,84 @@
+from sqlmodel import select
+from sqlalchemy import update
+from ..models.model_order import Order
+from .custom_types import StatusType, STATUS_TRANSITIONS, RESTOCK_STATUS_TYPES
+from .rollups import update_sales_rollup
+from .stock import restock_orders
+from .reservations import release_reservations
+from .events import publish_events, order_event
+
+
+
+BULK_STATUS_LIMIT = 5000
+
+
+
+def lock_orders(session, where, limit=BULK_STATUS_LIMIT, skip_locked=False):
+    # só as colunas necessárias para validar a transição e ajustar o rollup,
+    # travadas em ordem de id para que lotes concorrentes não entrem em deadlock
+    query = (
+        select(
+            Order.order_id,
+            Order.order_cli,
+            Order.order_prods,
+            Order.order_status,
+            Order.order_section,
+            Order.order_typepay,
+            Order.order_createdat,
+            Order.order_total,
+        )
+        .where(*where)
+        .order_by(Order.order_id)
+        .limit(limit)
+        .with_for_update(skip_locked=skip_locked)
+    )
+    return session.exec(query).all()
+
+
+
+def transition_orders(session, orders, new_status):
+    new_status = StatusType(new_status)
+    results = []
+    moved = []
+    
+    for order in orders:
+        current = StatusType(order.order_status)
+        
+        if new_status in STATUS_TRANSITIONS[current]:
+            moved.append(order)
+            results.append({"order_id": order.order_id, "ok": True, "detail": None})
+        else:
+            results.append({
+                "order_id": order.order_id, 
+                "ok": False, 
+                "detail": f"Transição inválida: '{current.value}' -> '{new_status.value}'."
+            })
+    
+    if moved:
+        # RETURNING: reservas, estoque e eventos só para as linhas que o UPDATE de fato alterou
+        updated = set(session.execute(
+            update(Order)
+            .where(Order.order_id.in_([order.order_id for order in moved]))
+            .values(order_status=new_status)
+            .returning(Order.order_id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all())
+        moved = [order for order in moved if order.order_id in updated]
+        update_sales_rollup(
+            session, 
+            [(order, order.order_status, -1) for order in moved] + [(order, new_status, 1) for order in moved]
+        )
+        apply_status_effects(session, [order.order_id for order in moved], new_status)
+        publish_events(session, [order_event(order, new_status) for order in moved])
+        
+    return results, moved
+
+
+
+def apply_status_effects(session, order_ids, new_status):
+    # fora de "em andamento" a reserva deixa de existir: vira venda ou é devolvida ao estoque
+    if new_status != StatusType.andamento:
+        release_reservations(session, order_ids)
+        
+    if new_status in RESTOCK_STATUS_TYPES:
+        restock_orders(session, order_ids)
@@ -0,0 +1,198 @@
+import asyncio, json, os, queue
+import urllib.request
+import sentry_sdk
+from datetime import datetime, timedelta
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import Session, select
+from sqlalchemy import insert, update, delete, text
+from ..models.model_outbox import OutboxEvent
+from .database import engine
+
+
+
+OUTBOX_SINK = os.getenv("OUTBOX_SINK", "file:outbox.ndjson")
+OUTBOX_RELAY_SECONDS = int(os.getenv("OUTBOX_RELAY_SECONDS", "2"))
+OUTBOX_RELAY_BATCH = 500
+OUTBOX_WEBHOOK_TIMEOUT = int(os.getenv("OUTBOX_WEBHOOK_TIMEOUT", "10"))
+# trava consultiva: um único relay publica por vez, mesmo com vários workers
+OUTBOX_RELAY_LOCK = "outbox_relay"
+# eventos já publicados ficam este tempo para os ouvintes do NOTIFY lerem, depois são removidos
+OUTBOX_RETENTION_HOURS = int(os.getenv("OUTBOX_RETENTION_HOURS", "24"))
+OUTBOX_PURGE_BATCH = 5000
+
+
+
+def add_outbox_events(session, events):
+    if not events:
+        return []
+    
+    return session.execute(insert(OutboxEvent).values([
+        {
+            "evt_type": event["type"],
+            "evt_key": event.get("order_id") or event.get("prod_id"),
+            "evt_payload": event,
+            "evt_createdat": datetime.utcnow(),
+            "evt_published": False,
+        }
+        for event in events
+    ]).returning(OutboxEvent.evt_id)).scalars().all()
+
+
+
+def read_outbox_events(ids):
+    with Session(engine) as session:
+        rows = session.exec(select(OutboxEvent.evt_id, OutboxEvent.evt_payload).where(OutboxEvent.evt_id.in_(ids))).all()
+    
+    return dict(rows)
+
+
+
+class FileSink:
+    def __init__(self, path):
+        self.path = path
+
+    def publish(self, events):
+        with open(self.path, "a", encoding="utf-8") as sink_file:
+            for event in events:
+                sink_file.write(json.dumps(event, default=str, ensure_ascii=False) + "\n")
+
+
+
+class WebhookSink:
+    def __init__(self, url):
+        self.url = url
+
+    def publish(self, events):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(events, default=str, ensure_ascii=False).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        # urlopen levanta HTTPError para respostas 4xx/5xx: o lote volta a ficar pendente
+        with urllib.request.urlopen(request, timeout=OUTBOX_WEBHOOK_TIMEOUT):
+            pass
+
+
+
+class QueueSink:
+    def __init__(self):
+        self.queue = queue.Queue()
+
+    def publish(self, events):
+        for event in events:
+            self.queue.put(event)
+
+
+
+def get_sink(spec=OUTBOX_SINK):
+    kind, _, target = spec.partition(":")
+    
+    if kind == "file":
+        return FileSink(target or "outbox.ndjson")
+    if kind == "webhook":
+        return WebhookSink(target)
+    if kind == "queue":
+        return QueueSink()
+    
+    raise ValueError(f"Destino de outbox desconhecido: '{spec}'")
+
+
+sink = get_sink()
+
+
+
+def relay_outbox_batch(target=None, batch_size=OUTBOX_RELAY_BATCH):
+    # entrega "pelo menos uma vez": se o envio passar e a marcação falhar, o lote é reenviado
+    # na próxima rodada; consumidores devem descartar ids de evento já recebidos
+    target = target or sink
+    lock = {"name": OUTBOX_RELAY_LOCK}
+
+    with engine.connect() as conn:
+        # trava de sessão, não de transação: nenhuma transação nem trava de linha fica aberta durante o envio
+        locked = conn.execute(text("SELECT pg_try_advisory_lock(hashtext(:name))"), lock).scalar()
+        conn.commit()
+
+        if not locked:
+            return 0
+
+        try:
+            pending = conn.execute(
+                select(
+                    OutboxEvent.evt_id,
+                    OutboxEvent.evt_type,
+                    OutboxEvent.evt_key,
+                    OutboxEvent.evt_createdat,
+                    OutboxEvent.evt_payload,
+                )
+                .where(OutboxEvent.evt_published == False)
+                .order_by(OutboxEvent.evt_id)
+                .limit(batch_size)
+            ).all()
+            conn.commit()
+
+            if not pending:
+                return 0
+
+            # o tempo do envio é limitado pelo destino (OUTBOX_WEBHOOK_TIMEOUT no webhook)
+            target.publish([
+                {
+                    "id": event.evt_id,
+                    "type": event.evt_type,
+                    "key": event.evt_key,
+                    "createdat": event.evt_createdat,
+                    "payload": event.evt_payload,
+                }
+                for event in pending
+            ])
+
+            conn.execute(
+                update(OutboxEvent)
+                .where(OutboxEvent.evt_id.in_([event.evt_id for event in pending]))
+                .values(evt_published=True)
+            )
+            conn.commit()
+
+            return len(pending)
+        finally:
+            try:
+                conn.rollback()
+                conn.execute(text("SELECT pg_advisory_unlock(hashtext(:name))"), lock)
+                conn.commit()
+            except Exception:
+                # sem conseguir liberar a trava, a conexão é descartada em vez de voltar ao pool com ela
+                conn.invalidate()
+
+
+
+def purge_published_outbox(batch_size=OUTBOX_PURGE_BATCH, retention_hours=OUTBOX_RETENTION_HOURS):
+    cutoff = datetime.utcnow() - timedelta(hours=retention_hours)
+
+    with Session(engine) as session:
+        # os mais antigos têm os menores ids: a chave primária acha o lote sem varrer a tabela
+        expired = (
+            select(OutboxEvent.evt_id)
+            .where(OutboxEvent.evt_published == True, OutboxEvent.evt_createdat < cutoff)
+            .order_by(OutboxEvent.evt_id)
+            .limit(batch_size)
+        )
+        deleted = session.execute(
+            delete(OutboxEvent)
+            .where(OutboxEvent.evt_id.in_(expired.scalar_subquery()))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        session.commit()
+
+        return deleted
+
+
+
+async def outbox_relay():
+    while True:
+        try:
+            while await run_in_threadpool(relay_outbox_batch) == OUTBOX_RELAY_BATCH:
+                pass
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+            
+        await asyncio.sleep(OUTBOX_RELAY_SECONDS)
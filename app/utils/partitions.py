@@ -0,0 +1,129 @@
+import asyncio, gzip, os
+import sentry_sdk
+from datetime import date, datetime
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event, text
+from ..models.model_order import Order
+from .database import engine
+
+
+
+ORDER_PARTITION_MONTHS_AHEAD = int(os.getenv("ORDER_PARTITION_MONTHS_AHEAD", "3"))
+ORDER_PARTITION_MONTHS_BACK = int(os.getenv("ORDER_PARTITION_MONTHS_BACK", "1"))
+ORDER_PARTITION_CHECK_SECONDS = int(os.getenv("ORDER_PARTITION_CHECK_SECONDS", "86400"))
+
+
+
+def add_months(day, months):
+    month = day.year * 12 + day.month - 1 + months
+    return date(month // 12, month % 12 + 1, 1)
+
+
+
+def order_partition_name(month):
+    return f"order_{month.year:04d}_{month.month:02d}"
+
+
+
+def create_order_partitions(conn, start, end):
+    month = add_months(start, 0)
+    created = []
+
+    while month <= end:
+        next_month = add_months(month, 1)
+        name = order_partition_name(month)
+        conn.execute(text(
+            f'CREATE TABLE IF NOT EXISTS {name} PARTITION OF "order" '
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')"
+        ))
+        created.append(name)
+        month = next_month
+
+    return created
+
+
+
+def split_default_partition(conn):
+    # pedidos de meses sem partição caem em order_default, que não pode ser arquivada:
+    # cada mês encontrado nela ganha sua própria partição
+    months = conn.execute(text(
+        "SELECT DISTINCT date_trunc('month', order_createdat)::date FROM order_default"
+    )).scalars().all()
+
+    if not months:
+        return []
+
+    # com a padrão anexada, criar a partição de um mês que já tem linhas nela falha;
+    # o DETACH bloqueia as escritas em "order" até o fim da transação
+    conn.execute(text('ALTER TABLE "order" DETACH PARTITION order_default'))
+    created = []
+
+    for month in sorted(months):
+        bounds = f"order_createdat >= '{month.isoformat()}' AND order_createdat < '{add_months(month, 1).isoformat()}'"
+        name = create_order_partitions(conn, month, month)[0]
+        conn.execute(text(f"INSERT INTO {name} SELECT * FROM order_default WHERE {bounds}"))
+        conn.execute(text(f"DELETE FROM order_default WHERE {bounds}"))
+        created.append(name)
+
+    conn.execute(text('ALTER TABLE "order" ATTACH PARTITION order_default DEFAULT'))
+
+    return created
+
+
+
+def ensure_order_partitions(conn=None):
+    if conn is None:
+        with engine.begin() as conn:
+            return ensure_order_partitions(conn)
+
+    today = datetime.utcnow().date()
+    start = add_months(today, -ORDER_PARTITION_MONTHS_BACK)
+    end = add_months(today, ORDER_PARTITION_MONTHS_AHEAD)
+
+    return split_default_partition(conn) + create_order_partitions(conn, start, end)
+
+
+
+@event.listens_for(Order.__table__, "after_create")
+def create_initial_partitions(target, connection, **kw):
+    # partição padrão recebe pedidos fora dos meses já criados
+    connection.execute(text('CREATE TABLE IF NOT EXISTS order_default PARTITION OF "order" DEFAULT'))
+    ensure_order_partitions(connection)
+
+
+
+def archive_order_partition(month, directory=None):
+    # desanexa o mês da tabela de pedidos; com directory, exporta para csv.gz e remove a tabela
+    name = order_partition_name(month)
+    archive = f"archive_{name}"
+
+    with engine.begin() as conn:
+        conn.execute(text(f'ALTER TABLE "order" DETACH PARTITION {name}'))
+        conn.execute(text(f"ALTER TABLE {name} RENAME TO {archive}"))
+
+        if directory is None:
+            return archive
+
+        path = os.path.join(directory, f"{archive}.csv.gz")
+        cursor = conn.connection.cursor()
+
+        try:
+            with gzip.open(path, "wt", encoding="utf-8") as file:
+                cursor.copy_expert(f"COPY {archive} TO STDOUT WITH (FORMAT csv, HEADER true)", file)
+        finally:
+            cursor.close()
+
+        conn.execute(text(f"DROP TABLE {archive}"))
+
+        return path
+
+
+
+async def partition_maintainer():
+    while True:
+        try:
+            await run_in_threadpool(ensure_order_partitions)
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+
+        await asyncio.sleep(ORDER_PARTITION_CHECK_SECONDS)
@@ -0,0 +1,106 @@
+import asyncio, os
+import sentry_sdk
+from datetime import datetime, timedelta
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import Session, select
+from sqlalchemy import delete, func, exists
+from ..models.model_client import Client
+from ..models.model_order import Order
+from ..models.model_product import Product
+from .services import delete_image_files
+from .outbox import purge_published_outbox, OUTBOX_PURGE_BATCH
+from .database import engine
+
+
+
+PURGE_RETENTION_DAYS = int(os.getenv("PURGE_RETENTION_DAYS", "30"))
+PURGE_CHECK_SECONDS = int(os.getenv("PURGE_CHECK_SECONDS", "900"))
+# janela fora do horário de pico, em horas UTC: início inclusivo, fim exclusivo
+PURGE_WINDOW = tuple(int(hour) for hour in os.getenv("PURGE_WINDOW", "3-6").split("-"))
+PURGE_BATCH = 500
+
+
+
+def in_purge_window(now=None):
+    hour = (now or datetime.utcnow()).hour
+    start, end = PURGE_WINDOW
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+
+def purge_deleted_clients(batch_size=PURGE_BATCH, retention_days=PURGE_RETENTION_DAYS):
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+
+    with Session(engine) as session:
+        # clientes com pedidos ficam para sempre como registro histórico
+        client_ids = session.exec(
+            select(Client.cli_id)
+            .where(
+                Client.cli_active == False,
+                Client.cli_deletedat < cutoff,
+                ~exists().where(Order.order_cli == Client.cli_id)
+            )
+            .order_by(Client.cli_deletedat)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+
+        if client_ids:
+            session.execute(delete(Client).where(Client.cli_id.in_(client_ids)))
+            session.commit()
+
+        return len(client_ids)
+
+
+
+def purge_deleted_products(batch_size=PURGE_BATCH, retention_days=PURGE_RETENTION_DAYS):
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+
+    with Session(engine) as session:
+        products = session.exec(
+            select(Product.prod_id, Product.prod_imgs)
+            .where(
+                Product.prod_active == False,
+                Product.prod_deletedat < cutoff,
+                ~exists().where(Order.order_prods.contains(func.jsonb_build_array(Product.prod_id)))
+            )
+            .order_by(Product.prod_deletedat)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+
+        if not products:
+            return 0
+
+        session.execute(delete(Product).where(Product.prod_id.in_([product.prod_id for product in products])))
+        session.commit()
+
+    # arquivos só são apagados depois que a remoção das linhas foi confirmada
+    for product in products:
+        delete_image_files(product.prod_imgs)
+
+    return len(products)
+
+
+
+def purge_deleted(batch_size=PURGE_BATCH):
+    return purge_deleted_clients(batch_size) + purge_deleted_products(batch_size)
+
+
+
+async def purge_worker():
+    while True:
+        try:
+            if in_purge_window():
+                while await run_in_threadpool(purge_deleted_clients) == PURGE_BATCH:
+                    pass
+                while await run_in_threadpool(purge_deleted_products) == PURGE_BATCH:
+                    pass
+                while await run_in_threadpool(purge_published_outbox) == OUTBOX_PURGE_BATCH:
+                    pass
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+
+        await asyncio.sleep(PURGE_CHECK_SECONDS)
@@ -0,0 +1,99 @@
+import asyncio, os
+import sentry_sdk
+from datetime import datetime, timedelta
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import Session, select
+from sqlalchemy import update, insert
+from ..models.model_order import Order
+from ..models.model_reservation import StockReservation
+from .custom_types import StatusType
+from .database import engine
+
+
+
+RESERVATION_TTL_MINUTES = int(os.getenv("RESERVATION_TTL_MINUTES", "30"))
+RESERVATION_SWEEP_SECONDS = int(os.getenv("RESERVATION_SWEEP_SECONDS", "60"))
+RESERVATION_SWEEP_BATCH = 500
+
+
+
+def reserve_stock(session, order_id, quantities):
+    expires_at = datetime.utcnow() + timedelta(minutes=RESERVATION_TTL_MINUTES)
+    
+    session.execute(insert(StockReservation).values([
+        {
+            "res_order": order_id,
+            "res_prod": prod_id,
+            "res_qty": qty,
+            "res_expiresat": expires_at,
+            "res_active": True,
+        }
+        for prod_id, qty in quantities.items()
+    ]))
+
+
+
+def release_reservations(session, order_ids):
+    session.execute(
+        update(StockReservation)
+        .where(StockReservation.res_order.in_(order_ids), StockReservation.res_active == True)
+        .values(res_active=False)
+        .execution_options(synchronize_session=False)
+    )
+
+
+
+def sweep_expired_reservations(batch_size=RESERVATION_SWEEP_BATCH):
+    # import local: order_status depende deste módulo para liberar reservas
+    from .order_status import lock_orders, transition_orders
+    
+    with Session(engine) as session:
+        # SKIP LOCKED: vários workers varrem lotes diferentes sem esperar uns pelos outros
+        expired = session.exec(
+            select(StockReservation.res_order)
+            .where(StockReservation.res_active == True, StockReservation.res_expiresat < datetime.utcnow())
+            .order_by(StockReservation.res_expiresat)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        
+        order_ids = sorted(set(expired))
+        
+        if not order_ids:
+            return 0
+        
+        orders = lock_orders(
+            session, 
+            [Order.order_id.in_(order_ids), Order.order_status == StatusType.andamento],
+            skip_locked=True
+        )
+        # a transição libera as reservas só dos pedidos cancelados agora; os pulados pelo
+        # SKIP LOCKED mantêm a reserva e voltam na próxima varredura
+        _, moved = transition_orders(session, orders, StatusType.cancelado)
+        
+        # pedido que já saiu de "em andamento" (ou foi removido) não volta a ele:
+        # a reserva que sobrou é liberada sem tocar no pedido
+        pending = set(session.exec(
+            select(Order.order_id).where(Order.order_id.in_(order_ids), Order.order_status == StatusType.andamento)
+        ).all())
+        stale = [order_id for order_id in order_ids if order_id not in pending]
+        if stale:
+            release_reservations(session, stale)
+        session.commit()
+        
+        # reservas vencidas deste lote efetivamente liberadas: 0 quando só restam pedidos travados
+        released = {order.order_id for order in moved} | set(stale)
+        return sum(1 for order_id in expired if order_id in released)
+
+
+
+async def reservation_sweeper():
+    while True:
+        try:
+            # repete enquanto houver progresso; lote sem nenhuma liberação espera o próximo ciclo
+            while await run_in_threadpool(sweep_expired_reservations):
+                pass
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+            
+        await asyncio.sleep(RESERVATION_SWEEP_SECONDS)
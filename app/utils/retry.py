@@ -0,0 +1,80 @@
+import os, random, threading, time
+from collections import Counter, defaultdict
+from fastapi import HTTPException
+from sqlalchemy.exc import DBAPIError
+
+
+
+TRANSACTION_RETRIES = int(os.getenv("TRANSACTION_RETRIES", "3"))
+TRANSACTION_BACKOFF_MS = int(os.getenv("TRANSACTION_BACKOFF_MS", "20"))
+
+# 40001: serialization_failure, 40P01: deadlock_detected
+RETRYABLE_PGCODES = {"40001", "40P01"}
+
+transaction_stats = defaultdict(Counter)
+_stats_lock = threading.Lock()
+
+
+
+def is_retryable(exc):
+    return isinstance(exc, DBAPIError) and getattr(exc.orig, "pgcode", None) in RETRYABLE_PGCODES
+
+
+
+def count_transaction(name, key):
+    with _stats_lock:
+        transaction_stats[name][key] += 1
+
+
+
+def transaction_backoff(attempt):
+    # backoff exponencial com jitter completo, para que as transações em conflito não colidam de novo
+    return random.uniform(0, TRANSACTION_BACKOFF_MS * 2 ** attempt) / 1000
+
+
+
+class TransactionAttempt:
+    def __init__(self, session, name, attempt, last):
+        self.session = session
+        self.name = name
+        self.attempt = attempt
+        self.last = last
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is None:
+            count_transaction(self.name, "committed")
+            return False
+
+        if not is_retryable(exc):
+            return False
+
+        self.session.rollback()
+        count_transaction(self.name, f"pgcode_{exc.orig.pgcode}")
+
+        if self.last:
+            count_transaction(self.name, "aborted")
+            raise HTTPException(
+                status_code=409,
+                detail="Conflito com outra operação simultânea, tente novamente."
+            ) from exc
+
+        count_transaction(self.name, "retried")
+        time.sleep(transaction_backoff(self.attempt))
+        return True
+
+
+
+def transaction_attempts(session, name, retries=None):
+    retries = TRANSACTION_RETRIES if retries is None else retries
+
+    for attempt in range(retries + 1):
+        yield TransactionAttempt(session, name, attempt, attempt == retries)
+
+
+
+def transaction_metrics():
+    with _stats_lock:
+        return {name: dict(stats) for name, stats in transaction_stats.items()}
@@ -0,0 +1,82 @@
+from collections import defaultdict
+from sqlalchemy import select, delete, func, cast, Date
+from sqlalchemy.dialects.postgresql import insert
+from ..models.model_rollup import SalesRollup
+from ..models.model_order import Order
+from .services import to_str_lower
+
+
+
+def rollup_deltas(entries):
+    deltas = defaultdict(lambda: [0, 0.0])
+    
+    for order, status, sign in entries:
+        key = (
+            order.order_createdat.date(),
+            to_str_lower(order.order_section),
+            to_str_lower(order.order_typepay),
+            to_str_lower(status),
+        )
+        deltas[key][0] += sign
+        deltas[key][1] += sign * order.order_total
+        
+    return deltas
+
+
+
+def update_sales_rollup(session, entries):
+    # entries: (pedido, status, +1 | -1); as chaves são ordenadas para que
+    # transações concorrentes travem as linhas do rollup sempre na mesma ordem
+    deltas = rollup_deltas(entries)
+    
+    rows = [
+        {
+            "roll_day": day,
+            "roll_section": section,
+            "roll_typepay": typepay,
+            "roll_status": status,
+            "roll_orders": orders,
+            "roll_revenue": round(revenue, 2),
+        }
+        for (day, section, typepay, status), (orders, revenue) in sorted(deltas.items())
+        if orders or revenue
+    ]
+    
+    if not rows:
+        return
+    
+    table = SalesRollup.__table__
+    stmt = insert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.roll_day, table.c.roll_section, table.c.roll_typepay, table.c.roll_status],
+        set_={
+            "roll_orders": table.c.roll_orders + stmt.excluded.roll_orders,
+            "roll_revenue": table.c.roll_revenue + stmt.excluded.roll_revenue,
+        }
+    )
+    session.execute(stmt)
+
+
+
+def rebuild_sales_rollup(session):
+    # recalcula o rollup inteiro a partir dos pedidos (carga inicial ou correção)
+    day = cast(Order.order_createdat, Date)
+    totals = session.execute(
+        select(day, Order.order_section, Order.order_typepay, Order.order_status, func.count(), func.sum(Order.order_total))
+        .group_by(day, Order.order_section, Order.order_typepay, Order.order_status)
+    ).all()
+    
+    session.execute(delete(SalesRollup))
+    
+    if totals:
+        session.execute(insert(SalesRollup).values([
+            {
+                "roll_day": row[0],
+                "roll_section": to_str_lower(row[1]),
+                "roll_typepay": to_str_lower(row[2]),
+                "roll_status": to_str_lower(row[3]),
+                "roll_orders": row[4],
+                "roll_revenue": round(row[5], 2),
+            }
+            for row in totals
+        ]))
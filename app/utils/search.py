@@ -0,0 +1,28 @@
+from sqlalchemy import func, or_, literal
+
+
+
+def normalize_text(value):
+    # mesma expressão usada nos índices trigram: sem acentos e em minúsculas
+    return func.immutable_unaccent(func.lower(value))
+
+
+
+def escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+
+def fuzzy_match(column, term):
+    normalized = normalize_text(column)
+    
+    # substring exata ou palavra parecida (tolerante a erros de digitação)
+    return or_(
+        normalized.like(func.concat("%", normalize_text(literal(escape_like(term))), "%"), escape="\\"),
+        normalize_text(literal(term)).op("<%")(normalized),
+    )
+
+
+
+def fuzzy_rank(column, term):
+    return func.word_similarity(normalize_text(literal(term)), normalize_text(column))
@@ -0,0 +1,55 @@
+import orjson
+from typing import Optional
+from pydantic import create_model
+from fastapi import HTTPException, Response
+
+
+
+def model_columns(model, fields=None):
+    # colunas na ordem dos campos do modelo: as chaves saem na mesma ordem do modelo
+    columns = [model.__table__.c[name] for name in model.model_fields if name in model.__table__.c]
+
+    if not fields:
+        return columns
+
+    # projeção (?fields=a,b): só as colunas pedidas são lidas do banco
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - {column.name for column in columns}
+
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "msg": f"Campo(s) inválido(s): {sorted(unknown)}",
+                "campos_validos": [column.name for column in columns]
+            }
+        )
+
+    return [column for column in columns if column.name in requested]
+
+
+
+def partial_model(model):
+    # esquema das listagens com ?fields=: os mesmos campos do modelo, todos opcionais,
+    # já que cada item traz apenas as chaves pedidas
+    return create_model(
+        f"{model.__name__}Fields",
+        **{
+            name: (Optional[field.annotation], None)
+            for name, field in model.model_fields.items()
+            if name in model.__table__.c
+        }
+    )
+
+
+
+def json_rows(rows, columns):
+    # linhas direto para bytes: sem instanciar o modelo, validar um response_model e passar pelo jsonable_encoder;
+    # as chaves seguem a ordem de model_columns, a mesma dos campos do modelo
+    names = [column.name for column in columns]
+
+    # select de uma coluna só devolve escalares, não tuplas
+    if len(names) == 1:
+        rows = [(row,) for row in rows]
+
+    return Response(content=orjson.dumps([dict(zip(names, row)) for row in rows]), media_type="application/json")
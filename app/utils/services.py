@@ -22,28 +22,40 @@ def to_str_lower(value):
 
 
 
-def handle_upload_images(product, files, images_dir="static/product_images"):
+def save_image_files(files, images_dir="static/product_images"):
     os.makedirs(images_dir, exist_ok=True)
-    if not product.prod_imgs:
-        product.prod_imgs = []
+    img_paths = []
     for file in files:
         ext = os.path.splitext(file.filename)[1]
         filename = f"{uuid4().hex}{ext}"
         file_path = os.path.join(images_dir, filename)
         with open(file_path, "wb") as image_file:
             image_file.write(file.file.read())
-        product.prod_imgs.append(f"/static/product_images/{filename}")
+        img_paths.append(f"/static/product_images/{filename}")
+    return img_paths
+
+
+
+def handle_upload_images(product, files, images_dir="static/product_images"):
+    if not product.prod_imgs:
+        product.prod_imgs = []
+    product.prod_imgs.extend(save_image_files(files, images_dir))
+
+
+
+def delete_image_files(img_paths, images_dir="static/product_images"):
+    for img_path in img_paths or []:
+        filename = os.path.basename(img_path)
+        file_path = os.path.join(images_dir, filename)
+        try:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        except Exception:
+            pass
 
 
 
 def handle_delete_images(product, images_dir="static/product_images"):
     if product.prod_imgs:
-        for img_path in product.prod_imgs:
-            filename = os.path.basename(img_path)
-            file_path = os.path.join(images_dir, filename)
-            try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-            except Exception:
-                pass
+        delete_image_files(product.prod_imgs, images_dir)
         product.prod_imgs = []
\ No newline at end of file
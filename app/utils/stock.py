@@ -0,0 +1,59 @@
+from collections import Counter
+from sqlmodel import select
+from sqlalchemy import update, case
+from ..models.model_order import Order
+from ..models.model_product import Product
+from .events import publish_events, product_event
+
+
+
+def order_quantities(order):
+    if order.order_items:
+        return Counter({item["prod_id"]: item["qty"] for item in order.order_items})
+    return Counter(order.order_prods)
+
+
+
+def lock_products(session, product_ids):
+    # bloquear sempre em ordem de id evita deadlocks entre pedidos com produtos em comum
+    return session.exec(
+        select(Product)
+        .where(Product.prod_id.in_(list(product_ids)), Product.prod_active == True)
+        .order_by(Product.prod_id)
+        .with_for_update()
+    ).all()
+
+
+
+def restock_orders(session, order_ids):
+    # marcar order_restocked na mesma instrução que seleciona os pedidos impede
+    # que uma transição repetida (ou concorrente) devolva o estoque duas vezes
+    restocked = session.execute(
+        update(Order)
+        .where(Order.order_id.in_(order_ids), Order.order_restocked == False)
+        .values(order_restocked=True)
+        .returning(Order.order_id, Order.order_items, Order.order_prods)
+        .execution_options(synchronize_session=False)
+    ).all()
+    
+    quantities = Counter()
+    for order in restocked:
+        quantities.update(order_quantities(order))
+        
+    if quantities:
+        session.execute(
+            select(Product.prod_id)
+            .where(Product.prod_id.in_(list(quantities)))
+            .order_by(Product.prod_id)
+            .with_for_update()
+        )
+        products = session.execute(
+            update(Product)
+            .where(Product.prod_id.in_(list(quantities)))
+            .values(prod_stock=Product.prod_stock + case(dict(quantities), value=Product.prod_id, else_=0))
+            .returning(Product.prod_id, Product.prod_stock, Product.prod_section)
+            .execution_options(synchronize_session=False)
+        ).all()
+        publish_events(session, [product_event(product) for product in products])
+        
+    return [order.order_id for order in restocked]
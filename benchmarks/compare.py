@@ -0,0 +1,73 @@
+import argparse, json, sys
+
+
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+
+def compare(baseline, candidate, threshold):
+    rows, regressions = [], []
+
+    for route in sorted(set(baseline["endpoints"]) | set(candidate["endpoints"])):
+        before = baseline["endpoints"].get(route)
+        after = candidate["endpoints"].get(route)
+
+        if not before or not after:
+            rows.append((route, "ausente na " + ("base" if not before else "comparação"), []))
+            continue
+
+        changes = []
+        for metric in METRICS + ("rps",):
+            old, new = before[metric], after[metric]
+            change = (new - old) / old * 100 if old else 0.0
+            changes.append((metric, old, new, change))
+
+            # latência maior ou vazão menor além do limite contam como regressão
+            worse = -change if metric == "rps" else change
+            if worse > threshold:
+                regressions.append((route, metric, old, new, change))
+
+        if after["errors"] > before["errors"]:
+            regressions.append((route, "errors", before["errors"], after["errors"], None))
+
+        rows.append((route, None, changes))
+
+    return rows, regressions
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara dois resultados do benchmarks.load e aponta regressões.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="variação percentual tolerada")
+    args = parser.parse_args()
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.candidate) as file:
+        candidate = json.load(file)
+
+    for name in ("mix", "concurrency", "dataset"):
+        if baseline["meta"].get(name) != candidate["meta"].get(name):
+            print(f"Aviso: {name} difere entre as execuções ({baseline['meta'].get(name)} x {candidate['meta'].get(name)}).")
+
+    rows, regressions = compare(baseline, candidate, args.threshold)
+
+    for route, note, changes in rows:
+        if note:
+            print(f"{route:32} {note}")
+            continue
+        print(f"{route:32} " + "  ".join(f"{metric} {old} -> {new} ({change:+.1f}%)" for metric, old, new, change in changes))
+
+    if regressions:
+        print(f"\n{len(regressions)} regressão(ões) acima de {args.threshold}%:")
+        for route, metric, old, new, change in regressions:
+            print(f"  {route} {metric}: {old} -> {new}" + (f" ({change:+.1f}%)" if change is not None else ""))
+        sys.exit(1)
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import argparse, asyncio, json, os, platform, random, subprocess, time, uuid
+from datetime import datetime, timedelta
+import httpx
+from .seed import DATASET_PATH, FIRST_NAMES, LAST_NAMES, client_name
+from app.utils.custom_types import CategoryType, SectionType, StatusType, PaymentType
+
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+PERCENTILES = (50, 90, 95, 99)
+
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.recording = False
+
+    def add(self, route, seconds, ok):
+        if not self.recording:
+            return
+        self.latencies.setdefault(route, []).append(seconds)
+        if not ok:
+            self.errors[route] = self.errors.get(route, 0) + 1
+
+
+
+def percentile(ordered, pct):
+    # nearest-rank: sempre um valor medido, sem interpolação
+    index = max(0, -(-len(ordered) * pct // 100) - 1)
+    return ordered[index]
+
+
+
+def summarize(latencies, errors, duration):
+    ordered = sorted(latencies)
+    summary = {
+        "count": len(ordered),
+        "errors": errors,
+        "rps": round(len(ordered) / duration, 2),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+    for pct in PERCENTILES:
+        summary[f"p{pct}_ms"] = round(percentile(ordered, pct) * 1000, 2)
+    return summary
+
+
+
+async def call(http, recorder, method, route, url, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = await http.request(method, url, **kwargs)
+    except httpx.HTTPError:
+        recorder.add(f"{method} {route}", time.perf_counter() - started, False)
+        return None
+
+    recorder.add(f"{method} {route}", time.perf_counter() - started, response.status_code < 400)
+    return response
+
+
+
+def name_prefix(rng, dataset):
+    cli_id = rng.randrange(1, dataset["clients"] + 1)
+    name = client_name(cli_id)
+    return name[:rng.randint(2, 6)] if rng.random() < 0.7 else rng.choice(LAST_NAMES)[:4]
+
+
+
+async def storefront(http, recorder, rng, dataset):
+    if rng.random() < 0.6:
+        params = {"num_page": rng.randint(1, 50)}
+        if rng.random() < 0.7:
+            params["category"] = rng.choice(list(CategoryType)).value
+        if rng.random() < 0.3:
+            params["availability"] = "true"
+        await call(http, recorder, "GET", "/products", "/products", params=params)
+    else:
+        prod_id = rng.randrange(1, dataset["products"] + 1)
+        await call(http, recorder, "GET", "/products/{id}", f"/products/{prod_id}")
+
+
+
+async def pos_checkout(http, recorder, rng, dataset):
+    # balcão: busca o cliente, abre o pedido e confirma o pagamento
+    await call(http, recorder, "GET", "/clients/autocomplete", "/clients/autocomplete", params={"q": name_prefix(rng, dataset)})
+
+    cli_id = rng.randrange(1, dataset["clients"] + 1)
+    await call(http, recorder, "GET", "/clients/{id}", f"/clients/{cli_id}")
+
+    order = {
+        "order_section": rng.choice(list(SectionType)).value,
+        "order_cli": cli_id,
+        "order_typepay": rng.choice(list(PaymentType)).value,
+        "order_address": f"Rua {rng.choice(LAST_NAMES)}, {rng.randrange(1, 2000)}",
+        "order_prods": [rng.randrange(1, dataset["products"] + 1) for _ in range(rng.randint(1, 3))],
+    }
+    key = str(uuid.UUID(int=rng.getrandbits(128)))
+    response = await call(http, recorder, "POST", "/orders", "/orders", json=order, headers={"Idempotency-Key": key})
+
+    if response is not None and response.status_code < 400:
+        order_id = response.json()["order_id"]
+        await call(
+            http, recorder, "PUT", "/orders/{id}", f"/orders/{order_id}",
+            json={"order_status": StatusType.pagamentook.value}
+        )
+
+
+
+async def backoffice(http, recorder, rng, dataset):
+    roll = rng.random()
+    end = datetime.fromisoformat(dataset["to"]).date()
+
+    if roll < 0.35:
+        start = end - timedelta(days=rng.choice([1, 7, 30]))
+        params = {"from": start.isoformat(), "to": end.isoformat(), "num_page": rng.randint(1, 5)}
+        if rng.random() < 0.5:
+            params["status"] = rng.choice(list(StatusType)).value
+        await call(http, recorder, "GET", "/orders", "/orders", params=params)
+    elif roll < 0.55:
+        start = end - timedelta(days=rng.choice([7, 30, 90]))
+        await call(
+            http, recorder, "GET", "/analytics/sales", "/analytics/sales",
+            params={"from": start.isoformat(), "to": end.isoformat()}
+        )
+    elif roll < 0.8:
+        cli_id = rng.randrange(1, dataset["clients"] + 1)
+        await call(
+            http, recorder, "GET", "/clients/{id}/orders", f"/clients/{cli_id}/orders",
+            params={"summary": "true"}
+        )
+    else:
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        await call(http, recorder, "GET", "/clients", "/clients", params={"name": name})
+
+
+
+MIXES = {
+    "storefront": {storefront: 1},
+    "pos": {pos_checkout: 1},
+    "backoffice": {backoffice: 1},
+    # perfil de um dia comum: vitrine domina, balcão e retaguarda dividem o resto
+    "mixed": {storefront: 6, pos_checkout: 2, backoffice: 2},
+}
+
+
+
+async def worker(http, recorder, scenarios, rng, dataset, deadline):
+    flows, weights = list(scenarios), list(scenarios.values())
+    while time.perf_counter() < deadline:
+        await rng.choices(flows, weights)[0](http, recorder, rng, dataset)
+
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--", "app"], capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+
+async def run(base_url, mix, concurrency, duration, warmup, seed_value, dataset):
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as http:
+        response = await http.post("/auth/login", json=dataset["user"])
+        response.raise_for_status()
+        http.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+        # aquecimento: conexões abertas, caches e planos preparados antes de medir
+        started = time.perf_counter()
+        deadline = started + warmup + duration
+        workers = [
+            asyncio.create_task(worker(http, recorder, MIXES[mix], random.Random(seed_value + i), dataset, deadline))
+            for i in range(concurrency)
+        ]
+        await asyncio.sleep(warmup)
+        recorder.recording = True
+        measured = time.perf_counter()
+        await asyncio.gather(*workers)
+        elapsed = time.perf_counter() - measured
+
+    endpoints = {
+        route: summarize(latencies, recorder.errors.get(route, 0), elapsed)
+        for route, latencies in sorted(recorder.latencies.items())
+    }
+    everything = [seconds for latencies in recorder.latencies.values() for seconds in latencies]
+    commit, dirty = git_revision()
+
+    return {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "date": datetime.utcnow().isoformat(timespec="seconds"),
+            "base_url": base_url,
+            "mix": mix,
+            "concurrency": concurrency,
+            "duration": round(elapsed, 2),
+            "warmup": warmup,
+            "seed": seed_value,
+            "python": platform.python_version(),
+            "dataset": {name: dataset[name] for name in ("seed", "products", "clients", "orders")},
+        },
+        "total": summarize(everything, sum(recorder.errors.values()), elapsed) if everything else {},
+        "endpoints": endpoints,
+    }
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera carga contra a API e mede latência e vazão por endpoint.")
+    parser.add_argument("--base-url", default=os.getenv("BENCH_BASE_URL", "http://localhost:8000"))
+    parser.add_argument("--mix", choices=MIXES, default="mixed")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=int, default=60, help="segundos medidos")
+    parser.add_argument("--warmup", type=int, default=10, help="segundos descartados antes da medição")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dataset", default=DATASET_PATH, help="manifesto gerado pelo benchmarks.seed")
+    parser.add_argument("--output", help="arquivo JSON de saída (padrão: benchmarks/results/<commit>-<mix>.json)")
+    args = parser.parse_args()
+
+    with open(args.dataset) as file:
+        dataset = json.load(file)
+
+    result = asyncio.run(run(args.base_url, args.mix, args.concurrency, args.duration, args.warmup, args.seed, dataset))
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{(result['meta']['commit'] or 'local')[:12]}-{args.mix}.json")
+
+    with open(output, "w") as file:
+        json.dump(result, file, indent=2, ensure_ascii=False)
+
+    for route, stats in result["endpoints"].items():
+        print(f"{route:32} {stats['count']:>8} req {stats['rps']:>8} req/s  p50 {stats['p50_ms']:>8} ms  p99 {stats['p99_ms']:>8} ms  erros {stats['errors']}")
+    print(f"Resultado salvo em {output}")
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+import argparse, gc, json, os, platform, statistics, sys, time, tracemalloc
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from app.endpoints.api_product import products_post
+from app.models.model_order import Order
+from app.models.model_product import Product
+from app.utils.auth import create_access_token, decode_token, get_password_hash, verify_password
+from app.utils.custom_types import SectionType, StatusType, PaymentType
+from app.utils.serialization import model_columns, json_rows
+
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "micro.json")
+MIN_TIME = 0.2
+REPEAT = 7
+MEMORY_CALLS = 20
+
+
+
+def make_products(count):
+    now = datetime(2024, 6, 1, 12, 0)
+    return [
+        Product(
+            prod_id=i,
+            prod_cat="feminino",
+            prod_price=round(9.9 + i % 490, 2),
+            prod_desc=f"Blusa de algodão {i}",
+            prod_barcode=f"{i:013d}",
+            prod_section="blusas",
+            prod_initialstock=100,
+            prod_name=f"Blusa {i}",
+            prod_size=["p", "m", "g"],
+            prod_color=["branco", "preto"],
+            prod_imgs=[f"/static/product_images/{i}.png"],
+            prod_createdat=now,
+            prod_lastupdate=now,
+            prod_stock=100,
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+
+def make_orders(count):
+    now = datetime(2024, 6, 1, 12, 0)
+    return [
+        Order(
+            order_id=i,
+            order_section=SectionType.blusas,
+            order_cli=i % 500 + 1,
+            order_total=99.9,
+            order_typepay=PaymentType.pix,
+            order_address="Rua das Palmeiras 15",
+            order_prods=[1, 2],
+            order_items=[{"prod_id": 1, "qty": 1, "price": 59.9}, {"prod_id": 2, "qty": 1, "price": 40.0}],
+            order_period=now + timedelta(minutes=i),
+            order_createdat=now + timedelta(minutes=i),
+            order_status=StatusType.andamento,
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+
+def serialize_response(adapter, objects):
+    # o mesmo caminho do FastAPI com response_model: valida a partir dos atributos e gera o JSON
+    return JSONResponse(jsonable_encoder(adapter.dump_python(adapter.validate_python(objects, from_attributes=True)))).body
+
+
+
+def validate_rows(model, rows):
+    # a partir de dicts: instâncias do próprio modelo passariam pela validação sem executar os validadores
+    return [model.model_validate(row) for row in rows]
+
+
+
+def as_rows(model, objects):
+    # tuplas na ordem de model_columns, como as linhas devolvidas pelo select
+    return [tuple(getattr(obj, column.name) for column in model_columns(model)) for obj in objects]
+
+
+
+def products_post_invalid(payload):
+    # seção inválida: executa todas as checagens de pertinência e sai antes de tocar no banco
+    try:
+        products_post(session=None, data=payload, files=None, current_user=None)
+    except HTTPException:
+        pass
+
+
+
+def build_cases():
+    token = create_access_token({"sub": "bench@example.com"})
+    password_hash = get_password_hash("bench123")
+    products_page, products_export = make_products(10), make_products(1000)
+    orders_page, orders_export = make_orders(10), make_orders(1000)
+    products_adapter = TypeAdapter(list[Product])
+    orders_adapter = TypeAdapter(list[Order])
+    products_page_rows, products_export_rows = as_rows(Product, products_page), as_rows(Product, products_export)
+    orders_page_rows, orders_export_rows = as_rows(Order, orders_page), as_rows(Order, orders_export)
+    product_columns, order_columns = model_columns(Product), model_columns(Order)
+    products_page_data = [product.model_dump() for product in products_page]
+    orders_page_data = [order.model_dump() for order in orders_page]
+    product_payload = json.dumps({
+        "prod_cat": "feminino",
+        "prod_price": 99.9,
+        "prod_barcode": "1234567890123",
+        "prod_section": "inexistente",
+        "prod_initialstock": 10,
+        "prod_name": "Blusa Branca",
+        "prod_size": ["P", "M", "G", "GG"],
+        "prod_color": ["Branco", "Preto", "Azul"],
+    })
+
+    return {
+        "auth.decode_token": lambda: decode_token(token),
+        "auth.verify_password": lambda: verify_password("bench123", password_hash),
+        "products_post.membership": lambda: products_post_invalid(product_payload),
+        "validate.products_page": lambda: validate_rows(Product, products_page_data),
+        "validate.orders_page": lambda: validate_rows(Order, orders_page_data),
+        "serialize.products_page": lambda: serialize_response(products_adapter, products_page),
+        "serialize.products_export": lambda: serialize_response(products_adapter, products_export),
+        "serialize.orders_page": lambda: serialize_response(orders_adapter, orders_page),
+        "serialize.orders_export": lambda: serialize_response(orders_adapter, orders_export),
+        "serialize_rows.products_page": lambda: json_rows(products_page_rows, product_columns).body,
+        "serialize_rows.products_export": lambda: json_rows(products_export_rows, product_columns).body,
+        "serialize_rows.orders_page": lambda: json_rows(orders_page_rows, order_columns).body,
+        "serialize_rows.orders_export": lambda: json_rows(orders_export_rows, order_columns).body,
+    }
+
+
+
+def calibrate(fn, min_time):
+    # dobra o número de chamadas até uma rodada durar ao menos min_time
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter() - started >= min_time:
+            return loops
+        loops *= 2
+
+
+
+def measure_time(fn, loops, repeat):
+    timings = []
+    # o coletor desligado evita pausas aleatórias dentro das rodadas
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for _ in range(loops):
+                fn()
+            timings.append((time.perf_counter() - started) / loops)
+    finally:
+        if enabled:
+            gc.enable()
+    return timings
+
+
+
+def measure_memory(fn, calls):
+    peaks, allocated = [], []
+    tracemalloc.start()
+    try:
+        for _ in range(calls):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            fn()
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            allocated.append(current - before)
+    finally:
+        tracemalloc.stop()
+    return statistics.median(peaks), statistics.median(allocated)
+
+
+
+def run_case(fn, min_time, repeat):
+    fn()
+    loops = calibrate(fn, min_time)
+    timings = measure_time(fn, loops, repeat)
+    peak, retained = measure_memory(fn, MEMORY_CALLS)
+
+    return {
+        "loops": loops,
+        "median_us": round(statistics.median(timings) * 1e6, 3),
+        "min_us": round(min(timings) * 1e6, 3),
+        "stdev_us": round(statistics.stdev(timings) * 1e6, 3) if len(timings) > 1 else 0.0,
+        "peak_kb": round(peak / 1024, 2),
+        "retained_kb": round(retained / 1024, 2),
+    }
+
+
+
+def compare(baseline, results, threshold):
+    regressions = []
+
+    for name, stats in results.items():
+        before = baseline.get("benchmarks", {}).get(name)
+        if not before:
+            print(f"{name:28} {stats['median_us']:>12} us  (sem baseline)")
+            continue
+
+        change = (stats["median_us"] - before["median_us"]) / before["median_us"] * 100
+        memory = stats["peak_kb"] - before["peak_kb"]
+        print(
+            f"{name:28} {before['median_us']:>12} -> {stats['median_us']:>12} us ({change:+.1f}%)"
+            f"  pico {before['peak_kb']} -> {stats['peak_kb']} KB"
+        )
+
+        # ruído menor que o desvio das duas medições não é regressão
+        noise = (stats["stdev_us"] + before["stdev_us"]) / before["median_us"] * 100
+        if change > max(threshold, noise):
+            regressions.append((name, "median_us", before["median_us"], stats["median_us"]))
+        if before["peak_kb"] and memory / before["peak_kb"] * 100 > threshold:
+            regressions.append((name, "peak_kb", before["peak_kb"], stats["peak_kb"]))
+
+    return regressions
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks dos caminhos quentes executados dentro do processo.")
+    parser.add_argument("names", nargs="*", help="benchmarks a executar (padrão: todos); aceita prefixos como serialize.")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--min-time", type=float, default=MIN_TIME, help="duração mínima de cada rodada em segundos")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="grava os resultados como nova baseline")
+    parser.add_argument("--threshold", type=float, default=10.0, help="variação percentual tolerada")
+    parser.add_argument("--output", help="grava os resultados desta execução em JSON")
+    args = parser.parse_args()
+
+    cases = build_cases()
+    selected = {
+        name: fn for name, fn in cases.items()
+        if not args.names or any(name.startswith(prefix) for prefix in args.names)
+    }
+
+    results = {name: run_case(fn, args.min_time, args.repeat) for name, fn in selected.items()}
+    report = {
+        "meta": {
+            "date": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "repeat": args.repeat,
+        },
+        "benchmarks": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        if os.path.exists(args.baseline):
+            # mantém as baselines dos benchmarks que não foram executados agora
+            with open(args.baseline) as file:
+                report["benchmarks"] = {**json.load(file)["benchmarks"], **results}
+        with open(args.baseline, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Baseline salva em {args.baseline}")
+
+    if not os.path.exists(args.baseline) or args.save:
+        for name, stats in results.items():
+            print(f"{name:28} {stats['median_us']:>12} us  ±{stats['stdev_us']}  pico {stats['peak_kb']} KB")
+        return
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+
+    if baseline["meta"].get("python") != report["meta"]["python"]:
+        print(f"Aviso: baseline gerada com Python {baseline['meta'].get('python')}.")
+
+    regressions = compare(baseline, results, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regressão(ões) acima de {args.threshold}%:")
+        for name, metric, old, new in regressions:
+            print(f"  {name} {metric}: {old} -> {new}")
+        sys.exit(1)
+
+
+
+if __name__ == "__main__":
+    main()
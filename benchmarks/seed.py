@@ -0,0 +1,248 @@
+import argparse, csv, io, json, os, random, time
+from datetime import datetime, timedelta
+from sqlmodel import Session, select
+from sqlalchemy import text
+from app.models.model_user import User
+from app.utils.auth import get_password_hash
+from app.utils.custom_types import SectionType, StatusType, PaymentType, CategoryType, SizeType, ColorType
+from app.utils.database import engine
+from app.utils.events import notify_events
+from app.utils.partitions import add_months, create_order_partitions
+from app.utils.rollups import rebuild_sales_rollup
+
+
+
+SCALES = {
+    "small": {"products": 10_000, "clients": 2_000, "orders": 50_000},
+    "full": {"products": 1_000_000, "clients": 200_000, "orders": 5_000_000},
+}
+COPY_CHUNK = 50_000
+DATASET_PATH = os.path.join(os.path.dirname(__file__), "dataset.json")
+
+BENCH_USER_EMAIL = "bench@example.com"
+BENCH_USER_PASS = "bench123"
+
+FIRST_NAMES = [
+    "Ana", "Bruno", "Carla", "Daniel", "Eduarda", "Felipe", "Gabriela", "Heitor", "Isabela", "João",
+    "Larissa", "Marcos", "Natália", "Otávio", "Paula", "Rafael", "Sofia", "Thiago", "Valéria", "Vinícius",
+]
+LAST_NAMES = [
+    "Almeida", "Barbosa", "Cardoso", "Costa", "Ferreira", "Gomes", "Lima", "Martins", "Oliveira", "Pereira",
+    "Ribeiro", "Rocha", "Santos", "Silva", "Souza",
+]
+PRODUCT_NAMES = ["Blusa", "Vestido", "Short", "Calça", "Saia", "Camiseta", "Jaqueta", "Macacão"]
+
+CATEGORIES = list(CategoryType)
+SECTIONS = list(SectionType)
+STATUSES = list(StatusType)
+PAYMENTS = list(PaymentType)
+
+
+
+def client_name(i):
+    # determinístico a partir do id: o gerador de carga reconstrói os nomes sem consultar o banco
+    first = FIRST_NAMES[i % len(FIRST_NAMES)]
+    last = LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]
+    return f"{first} {last} {i}"[:30]
+
+
+
+def product_rows(rng, count, now, prices):
+    for prod_id in range(1, count + 1):
+        section = rng.choice(SECTIONS)
+        yield [
+            prod_id,
+            rng.choice(CATEGORIES).value,
+            prices[prod_id],
+            f"{rng.choice(PRODUCT_NAMES)} {section.value} {prod_id}",
+            f"{prod_id:013d}",
+            section.value,
+            1000,
+            f"{rng.choice(PRODUCT_NAMES)} {prod_id}",
+            json.dumps(rng.sample([size.value for size in SizeType], 2)),
+            json.dumps(rng.sample([color.value for color in ColorType], 2)),
+            "[]",
+            now,
+            now,
+            1000,
+            True,
+        ]
+
+
+
+def client_rows(rng, count, now):
+    for cli_id in range(1, count + 1):
+        yield [
+            cli_id,
+            client_name(cli_id),
+            f"cli{cli_id}@exemplo.com",
+            f"{cli_id:011d}",
+            f"119{rng.randrange(10 ** 8):08d}",
+            f"Rua {rng.choice(LAST_NAMES)}, {rng.randrange(1, 2000)}",
+            now,
+            True,
+        ]
+
+
+
+def order_rows(rng, count, products, clients, start, span_seconds, prices):
+    # datas crescentes com o id, como na produção: mantém o BRIN e as partições realistas
+    step = span_seconds / count
+    for order_id in range(1, count + 1):
+        createdat = start + timedelta(seconds=order_id * step)
+        prods = [rng.randrange(1, products + 1) for _ in range(rng.randint(1, 3))]
+        items = {}
+        for prod_id in prods:
+            items[prod_id] = items.get(prod_id, 0) + 1
+        order_items = [{"prod_id": prod_id, "qty": qty, "price": prices[prod_id]} for prod_id, qty in items.items()]
+        yield [
+            order_id,
+            rng.choice(SECTIONS).name,
+            rng.randrange(1, clients + 1),
+            round(sum(item["qty"] * item["price"] for item in order_items), 2),
+            rng.choice(PAYMENTS).name,
+            f"Rua {rng.choice(LAST_NAMES)}, {rng.randrange(1, 2000)}",
+            json.dumps(prods),
+            createdat,
+            createdat,
+            rng.choice(STATUSES).name,
+            json.dumps(order_items),
+            False,
+        ]
+
+
+
+def copy_rows(conn, table, columns, rows):
+    cursor = conn.connection.cursor()
+    total = 0
+    try:
+        while True:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            written = 0
+            for row in rows:
+                writer.writerow(row)
+                written += 1
+                if written == COPY_CHUNK:
+                    break
+
+            if not written:
+                return total
+
+            buffer.seek(0)
+            cursor.copy_expert(f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buffer)
+            total += written
+    finally:
+        cursor.close()
+
+
+
+def reset_sequence(conn, table, column):
+    conn.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), (SELECT coalesce(max({column}), 1) FROM {table}))"
+    ))
+
+
+
+def seed(products, clients, orders, months, seed_value):
+    now = datetime.utcnow().replace(microsecond=0)
+    start = datetime(*add_months(now.date(), -months).timetuple()[:3])
+    timings = {}
+
+    # preços em função do id: o mesmo gerador recria os produtos e os itens dos pedidos
+    price_rng = random.Random(seed_value)
+    prices = [0.0] + [round(price_rng.uniform(9.9, 499.9), 2) for _ in range(products)]
+
+    with engine.begin() as conn:
+        conn.execute(text(
+            'TRUNCATE product, client, "order", salesrollup, stockreservation, outboxevent, idempotencykey RESTART IDENTITY'
+        ))
+        create_order_partitions(conn, start.date(), now.date())
+
+        started = time.perf_counter()
+        copy_rows(conn, "product", [
+            "prod_id", "prod_cat", "prod_price", "prod_desc", "prod_barcode", "prod_section", "prod_initialstock",
+            "prod_name", "prod_size", "prod_color", "prod_imgs", "prod_createdat", "prod_lastupdate", "prod_stock", "prod_active",
+        ], product_rows(random.Random(seed_value + 3), products, now, prices))
+        timings["products"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        copy_rows(conn, "client", [
+            "cli_id", "cli_name", "cli_email", "cli_cpf", "cli_phone", "cli_address", "cli_createdat", "cli_active",
+        ], client_rows(random.Random(seed_value + 1), clients, now))
+        timings["clients"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        copy_rows(conn, '"order"', [
+            "order_id", "order_section", "order_cli", "order_total", "order_typepay", "order_address", "order_prods",
+            "order_period", "order_createdat", "order_status", "order_items", "order_restocked",
+        ], order_rows(
+            random.Random(seed_value + 2), orders, products, clients,
+            start, (now - start).total_seconds(), prices
+        ))
+        timings["orders"] = time.perf_counter() - started
+
+        reset_sequence(conn, "product", "prod_id")
+        reset_sequence(conn, "client", "cli_id")
+        reset_sequence(conn, '"order"', "order_id")
+
+    with Session(engine) as session:
+        started = time.perf_counter()
+        rebuild_sales_rollup(session)
+
+        if not session.exec(select(User).where(User.usr_email == BENCH_USER_EMAIL)).first():
+            session.add(User(
+                usr_name="benchmark",
+                usr_email=BENCH_USER_EMAIL,
+                usr_pass=get_password_hash(BENCH_USER_PASS),
+                usr_type="administrador",
+                usr_createdat=now,
+                usr_lastupdate=now,
+            ))
+
+        # workers em execução reconstroem o índice de autocomplete com os novos clientes
+        notify_events(session, [{"type": "client", "rebuild": True}])
+        session.commit()
+        timings["rollup"] = time.perf_counter() - started
+
+    # estatísticas e mapa de visibilidade atualizados: planos e index-only scans realistas
+    started = time.perf_counter()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text('VACUUM (ANALYZE) product, client, "order", salesrollup'))
+    timings["vacuum"] = time.perf_counter() - started
+
+    dataset = {
+        "seed": seed_value,
+        "products": products,
+        "clients": clients,
+        "orders": orders,
+        "from": start.isoformat(),
+        "to": now.isoformat(),
+        "user": {"usr_email": BENCH_USER_EMAIL, "usr_pass": BENCH_USER_PASS},
+        "timings": {name: round(seconds, 2) for name, seconds in timings.items()},
+    }
+    with open(DATASET_PATH, "w") as file:
+        json.dump(dataset, file, indent=2)
+
+    return dataset
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carrega uma massa de dados determinística para os benchmarks.")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--products", type=int)
+    parser.add_argument("--clients", type=int)
+    parser.add_argument("--orders", type=int)
+    parser.add_argument("--months", type=int, default=12, help="meses de histórico de pedidos")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    sizes = {name: getattr(args, name) or value for name, value in SCALES[args.scale].items()}
+    dataset = seed(sizes["products"], sizes["clients"], sizes["orders"], args.months, args.seed)
+    print(json.dumps(dataset, indent=2, ensure_ascii=False))
+
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ from fastapi.testclient import TestClient
 import pytest
 from datetime import datetime
 from sqlmodel import Session
+from sqlalchemy import delete
 from app.utils.services import unique_email, unique_cpf
 from app.utils.auth import get_password_hash
 from app.models.model_client import Client
@@ -167,8 +168,10 @@ def create_product(session):
     session.add(product)
     session.commit()
     session.refresh(product)
+    product_id = product.prod_id
     yield product
-    session.delete(product)
+    # o teste pode já ter purgado a linha: remove pelo id, sem recarregar o objeto
+    session.exec(delete(Product).where(Product.prod_id == product_id).execution_options(synchronize_session=False))
     session.commit()
 
 
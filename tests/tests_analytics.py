@@ -0,0 +1,53 @@
+from fastapi.testclient import TestClient
+from datetime import datetime
+
+
+def test_sales_rollup_follows_order_lifecycle(
+    client: TestClient,
+    client_obj,
+    products_obj,
+    auth_headers
+):
+    order_data = {
+        "order_section": "blusas",
+        "order_cli": client_obj.cli_id,
+        "order_total": 31.49,
+        "order_typepay": "crédito",
+        "order_address": "Test Address 123",
+        "order_prods": [p.prod_id for p in products_obj]
+    }
+    create_resp = client.post("/orders", json=order_data, headers=auth_headers)
+    assert create_resp.status_code == 200, create_resp.text
+    order_id = create_resp.json()["order_id"]
+
+    response = client.get("/analytics/sales", headers=auth_headers)
+    data = response.json()
+    assert response.status_code == 200
+    assert len(data) == 1
+    assert data[0]["roll_day"] == datetime.utcnow().date().isoformat()
+    assert data[0]["roll_section"] == "blusas"
+    assert data[0]["roll_typepay"] == "crédito"
+    assert data[0]["roll_status"] == "em andamento"
+    assert data[0]["roll_orders"] == 1
+    assert data[0]["roll_revenue"] == 31.49
+
+    client.put(f"/orders/{order_id}", json={"order_status": "Pagamento Confirmado"}, headers=auth_headers)
+    response = client.get("/analytics/sales", params={"status": "pagamento confirmado"}, headers=auth_headers)
+    data = response.json()
+    assert len(data) == 1
+    assert data[0]["roll_orders"] == 1
+
+    client.delete(f"/orders/{order_id}", headers=auth_headers)
+    response = client.get("/analytics/sales", headers=auth_headers)
+    assert response.json() == []
+    
+    
+    
+
+def test_sales_rollup_filters_by_range(
+    client: TestClient,
+    auth_headers
+):
+    response = client.get("/analytics/sales", params={"from": "2000-01-01", "to": "2000-01-31"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json() == []
@@ -1,6 +1,12 @@
+import json, threading
 from fastapi.testclient import TestClient
 from app.main import app
 from app.utils.services import unique_email, unique_cpf
+from app.utils.purge import purge_deleted_clients
+from app.utils import client_import
+from app.utils.autocomplete import PrefixIndex
+from app.utils.serialization import model_columns
+from app.models.model_client import Client
 
 client = TestClient(app)
 
@@ -23,7 +29,7 @@ def test_create_client_duplicate_email(
     client.post("/clients", json=client_data, headers=auth_headers)
     client_data["cli_cpf"] = unique_cpf()
     response = client.post("/clients", json=client_data, headers=auth_headers)
-    assert response.status_code == 401
+    assert response.status_code == 409
     assert "email" in response.json()["detail"].lower()
 
 
@@ -36,12 +42,121 @@ def test_create_client_duplicate_cpf(
     client.post("/clients", json=client_data, headers=auth_headers)
     client_data["cli_email"] = unique_email()
     response = client.post("/clients", json=client_data, headers=auth_headers)
-    assert response.status_code == 401
+    assert response.status_code == 409
     assert "cpf" in response.json()["detail"].lower()
 
 
 
 
+def test_create_client_duplicate_normalized_cpf_and_email(
+    client_data, 
+    auth_headers
+):
+    cpf = client_data["cli_cpf"]
+    client_data["cli_cpf"] = f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}"
+    response = client.post("/clients", json=client_data, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["cli_cpf"] == cpf
+
+    response = client.post("/clients", json={**client_data, "cli_cpf": cpf, "cli_email": unique_email()}, headers=auth_headers)
+    assert response.status_code == 409
+    assert "cpf" in response.json()["detail"].lower()
+
+    response = client.post("/clients", json={**client_data, "cli_cpf": unique_cpf(), "cli_email": client_data["cli_email"].upper()}, headers=auth_headers)
+    assert response.status_code == 409
+    assert "email" in response.json()["detail"].lower()
+
+
+
+
+def test_create_client_idempotency_key_replay(
+    client_data,
+    auth_headers
+):
+    headers = {**auth_headers, "Idempotency-Key": "cliente-0001"}
+    first = client.post("/clients", json=client_data, headers=headers)
+    second = client.post("/clients", json=client_data, headers=headers)
+    assert first.status_code == 200, first.text
+    assert second.status_code == 200, second.text
+    assert second.json()["cli_id"] == first.json()["cli_id"]
+
+
+
+
+def test_import_clients_csv(
+    client_data,
+    auth_headers
+):
+    existing = client.post("/clients", json=client_data, headers=auth_headers)
+    assert existing.status_code == 200, existing.text
+
+    cpf = unique_cpf()
+    email = unique_email()
+    content = "\n".join([
+        "cli_name,cli_email,cli_cpf,cli_phone,cli_address",
+        f"Cliente Importado,{email},{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]},(11) 98765-4321,Rua Exemplo 123",
+        f"Cliente Repetido,{unique_email()},{cpf},11987654321,Rua Exemplo 123",
+        f"Cliente Existente,{unique_email()},{client_data['cli_cpf']},11987654321,Rua Exemplo 123",
+        f"Cliente Inválido,email-invalido,{unique_cpf()},11987654321,Rua Exemplo 123",
+    ])
+    response = client.post(
+        "/clients/import",
+        files={"file": ("clientes.csv", content.encode(), "text/csv")},
+        headers=auth_headers
+    )
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert [row["status"] for row in data["rows"]] == ["duplicado_arquivo", "duplicado", "invalido"]
+    assert data["rows"][2] == {"line": 5, "status": "invalido", "detail": "Email inválido."}
+    assert data["total"] == 4
+    assert data["inserido"] == 1
+    assert data["rows_truncated"] is False
+
+    response = client.get("/clients", params={"email": email}, headers=auth_headers)
+    imported = next(c for c in response.json() if c["cli_email"] == email)
+    assert imported["cli_cpf"] == cpf
+    assert imported["cli_phone"] == "11987654321"
+
+
+
+def test_import_clients_ndjson(auth_headers):
+    rows = [
+        {"cli_name": "Cliente NDJSON", "cli_email": unique_email(), "cli_cpf": unique_cpf(), "cli_phone": "11987654321", "cli_address": "Rua Exemplo 123"},
+        {"cli_name": "Cliente NDJSON 2", "cli_email": unique_email(), "cli_cpf": unique_cpf(), "cli_phone": "11987654321", "cli_address": None},
+    ]
+    content = "\n".join(json.dumps(row) for row in rows) + "\n{quebrado\n"
+    response = client.post(
+        "/clients/import",
+        files={"file": ("clientes.ndjson", content.encode(), "application/x-ndjson")},
+        headers=auth_headers
+    )
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["inserido"] == 2
+    assert data["invalido"] == 1
+    assert data["rows"] == [{"line": 3, "status": "invalido", "detail": "Linha inválida."}]
+
+
+
+def test_import_clients_report_is_capped(
+    auth_headers,
+    monkeypatch
+):
+    monkeypatch.setattr(client_import, "CLIENT_IMPORT_REPORT_LIMIT", 2)
+    content = "\n".join(["{quebrado"] * 5)
+    response = client.post(
+        "/clients/import",
+        files={"file": ("clientes.ndjson", content.encode(), "application/x-ndjson")},
+        headers=auth_headers
+    )
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["invalido"] == 5
+    assert [row["line"] for row in data["rows"]] == [1, 2]
+    assert data["rows_truncated"] is True
+
+
+
 def test_get_clients(auth_headers):
     response = client.get("/clients", headers=auth_headers)
     assert response.status_code == 200
@@ -60,6 +175,114 @@ def test_get_clients_with_filter(
 
 
 
+def test_get_clients_same_shape_as_response_model(
+    client_data,
+    auth_headers
+):
+    client.post("/clients", json=client_data, headers=auth_headers)
+    response = client.get("/clients", headers=auth_headers)
+    assert response.status_code == 200, response.text
+
+    for item in response.json():
+        expected = client.get(f"/clients/{item['cli_id']}", headers=auth_headers).json()
+        assert item == expected
+        assert list(item) == [column.name for column in model_columns(Client)]
+
+
+
+def test_get_clients_with_fields(
+    client_data,
+    auth_headers
+):
+    create_resp = client.post("/clients", json=client_data, headers=auth_headers)
+    response = client.get("/clients", params={"fields": "cli_id,cli_name"}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert {"cli_id": create_resp.json()["cli_id"], "cli_name": client_data["cli_name"]} in response.json()
+
+
+
+def test_get_clients_fuzzy_search(
+    client_data,
+    auth_headers
+):
+    client_data["cli_name"] = "Quitéria Brandão"
+    create_resp = client.post("/clients", json=client_data, headers=auth_headers)
+    assert create_resp.status_code == 200, create_resp.text
+    client_id = create_resp.json()["cli_id"]
+
+    for term in ["quiteria", "QUITÉRIA BRANDÃO", "Quiteria Brandal"]:
+        response = client.get("/clients", params={"name": term, "limit": 10}, headers=auth_headers)
+        assert response.status_code == 200, response.text
+        assert client_id in [c["cli_id"] for c in response.json()], term
+
+    response = client.get("/clients", params={"email": client_data["cli_email"][:6]}, headers=auth_headers)
+    assert client_id in [c["cli_id"] for c in response.json()]
+
+    response = client.get("/clients", params={"name": "%"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+
+def test_clients_autocomplete(
+    client_data,
+    auth_headers
+):
+    client_data["cli_name"] = "Zuleica Fontoura"
+    create_resp = client.post("/clients", json=client_data, headers=auth_headers)
+    assert create_resp.status_code == 200, create_resp.text
+    client_id = create_resp.json()["cli_id"]
+
+    for term in ["zul", "Zuléica F", "FONT"]:
+        response = client.get("/clients/autocomplete", params={"q": term}, headers=auth_headers)
+        assert response.status_code == 200, response.text
+        assert {"cli_id": client_id, "cli_name": "Zuleica Fontoura"} in response.json(), term
+
+    client.put(f"/clients/{client_id}", json={"cli_name": "Zuleica Barbosa"}, headers=auth_headers)
+    response = client.get("/clients/autocomplete", params={"q": "fontoura"}, headers=auth_headers)
+    assert client_id not in [c["cli_id"] for c in response.json()]
+    response = client.get("/clients/autocomplete", params={"q": "barb"}, headers=auth_headers)
+    assert client_id in [c["cli_id"] for c in response.json()]
+
+    client.delete(f"/clients/{client_id}", headers=auth_headers)
+    response = client.get("/clients/autocomplete", params={"q": "zuleica"}, headers=auth_headers)
+    assert client_id not in [c["cli_id"] for c in response.json()]
+
+
+
+def test_autocomplete_serves_stale_index_while_rebuilding(monkeypatch):
+    index = PrefixIndex()
+    index.build([(1, "Ana Souza")])
+    index.invalidate()
+
+    started, release = threading.Event(), threading.Event()
+    loads = []
+
+    def slow_fetch():
+        loads.append(1)
+        started.set()
+        release.wait(5)
+        return [(1, "Ana Souza"), (2, "Ana Lima")]
+
+    monkeypatch.setattr(index, "fetch_names", slow_fetch)
+
+    # a busca não espera a reconstrução nem dispara outra enquanto ela roda
+    assert index.search("ana") == [{"cli_id": 1, "cli_name": "Ana Souza"}]
+    assert started.wait(5)
+    assert index.search("ana") == [{"cli_id": 1, "cli_name": "Ana Souza"}]
+
+    # cadastro recebido durante a leitura do banco não se perde na troca do índice
+    index.add(3, "Ana Prado")
+    release.set()
+    with index.rebuild_lock:
+        pass
+
+    assert loads == [1]
+    assert index.ready
+    assert [c["cli_id"] for c in index.search("ana")] == [2, 3, 1]
+
+
+
 def test_get_client_by_id(
     client_data,
     auth_headers
@@ -79,6 +302,41 @@ def test_get_client_by_invalid_id(auth_headers):
 
 
 
+def test_client_order_history(
+    client_obj,
+    products_obj,
+    auth_headers
+):
+    order_ids = []
+    for _ in range(3):
+        order_data = {
+            "order_section": "blusas",
+            "order_cli": client_obj.cli_id,
+            "order_typepay": "crédito",
+            "order_address": "Test Address 123",
+            "order_prods": [products_obj[0].prod_id]
+        }
+        create_resp = client.post("/orders", json=order_data, headers=auth_headers)
+        assert create_resp.status_code == 200, create_resp.text
+        order_ids.append(create_resp.json()["order_id"])
+
+    response = client.get(f"/clients/{client_obj.cli_id}/orders", params={"limit": 2, "summary": True}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert [o["order_id"] for o in data["orders"]] == order_ids[::-1][:2]
+    assert data["summary"]["orders"] == 3
+    assert data["summary"]["lifetime_value"] == round(3 * products_obj[0].prod_price, 2)
+
+    response = client.get(f"/clients/{client_obj.cli_id}/orders", params=data["next"], headers=auth_headers)
+    data = response.json()
+    assert [o["order_id"] for o in data["orders"]] == order_ids[:1]
+    assert data["next"] is None
+
+    response = client.get("/clients/99999/orders", headers=auth_headers)
+    assert response.status_code == 404
+
+
+
 def test_update_client(
     client_data,
     auth_headers
@@ -123,6 +381,26 @@ def test_delete_client(
 
 
 
+def test_soft_delete_and_purge_client(
+    client_data,
+    auth_headers
+):
+    create_resp = client.post("/clients", json=client_data, headers=auth_headers)
+    client_id = create_resp.json()["cli_id"]
+    assert client.delete(f"/clients/{client_id}", headers=auth_headers).status_code == 200
+
+    assert client.get(f"/clients/{client_id}", headers=auth_headers).status_code == 404
+    assert client.delete(f"/clients/{client_id}", headers=auth_headers).status_code == 404
+
+    # email e CPF do cliente removido podem ser cadastrados novamente
+    recreate_resp = client.post("/clients", json=client_data, headers=auth_headers)
+    assert recreate_resp.status_code == 200, recreate_resp.text
+
+    assert purge_deleted_clients(retention_days=0) >= 1
+    assert client.get(f"/clients/{recreate_resp.json()['cli_id']}", headers=auth_headers).status_code == 200
+
+
+
 def test_delete_nonexistent_client(auth_headers):
     response = client.delete("/clients/99999", headers=auth_headers)
     assert response.status_code == 404
\ No newline at end of file
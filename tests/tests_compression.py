@@ -0,0 +1,74 @@
+import zlib
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from app.main import app
+from app.utils.compression import CompressionMiddleware, negotiate_encoding, compressed_bodies, ENCODINGS
+
+client = TestClient(app)
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding("") is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("gzip;q=0") is None
+    assert negotiate_encoding("*;q=0") is None
+    assert negotiate_encoding("gzip") == "gzip"
+    assert negotiate_encoding("deflate, gzip;q=0.5") == "gzip"
+    # empate: vence a preferência do servidor
+    assert negotiate_encoding("*") == list(ENCODINGS)[0]
+
+
+
+def test_large_response_is_gzipped():
+    response = client.get("/openapi.json", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) < len(response.content)
+    assert response.json()["paths"]
+
+
+
+def test_small_or_unaccepted_responses_are_not_compressed(auth_headers):
+    response = client.get("/products", headers={**auth_headers, "Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+
+    response = client.get("/openapi.json", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+
+
+
+def test_repeated_body_served_from_compressed_cache():
+    client.get("/openapi.json", headers={"Accept-Encoding": "gzip"})
+    hits = compressed_bodies.stats()["hits"]
+
+    client.get("/openapi.json", headers={"Accept-Encoding": "gzip"})
+    assert compressed_bodies.stats()["hits"] == hits + 1
+
+
+
+def test_streaming_response_compressed_per_chunk():
+    chunks = [f"linha {i}\n".encode() * 200 for i in range(5)]
+    stream_app = FastAPI()
+
+    @stream_app.get("/export")
+    def export():
+        return StreamingResponse(iter(chunks), media_type="text/csv")
+
+    @stream_app.get("/events")
+    def events():
+        return StreamingResponse(iter(chunks), media_type="text/event-stream")
+
+    stream_app.add_middleware(CompressionMiddleware)
+    stream_client = TestClient(stream_app)
+
+    with stream_client.stream("GET", "/export", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        raw = b"".join(response.iter_raw())
+    assert zlib.decompress(raw, 31) == b"".join(chunks)
+
+    response = stream_client.get("/events", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
@@ -0,0 +1,114 @@
+import json, select
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select as sql_select
+from sqlalchemy import text
+from app.models.model_outbox import OutboxEvent
+from app.utils.database import engine
+from app.utils.events import EVENTS_CHANNEL, event_matches
+from app.utils.outbox import QueueSink, relay_outbox_batch, read_outbox_events, purge_published_outbox, OUTBOX_RELAY_LOCK
+
+
+def test_event_matches_filters():
+    event = {
+        "type": "order",
+        "order_id": 1,
+        "order_status": "em andamento",
+        "order_section": "blusas",
+        "order_cli": 7,
+        "order_prods": [1, 2]
+    }
+    assert event_matches(event)
+    assert event_matches(event, section="blusas", product=2, client=7)
+    assert not event_matches(event, section="calças")
+    assert not event_matches(event, product=3)
+    assert not event_matches(event, client=8)
+    
+    
+    
+
+def test_order_creation_notifies_listeners(
+    client: TestClient,
+    client_obj,
+    products_obj,
+    auth_headers
+):
+    connection = engine.raw_connection()
+    dbapi_connection = connection.driver_connection
+    dbapi_connection.autocommit = True
+    try:
+        with dbapi_connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {EVENTS_CHANNEL}")
+
+        order_data = {
+            "order_section": "blusas",
+            "order_cli": client_obj.cli_id,
+            "order_typepay": "crédito",
+            "order_address": "Test Address 123",
+            "order_prods": [p.prod_id for p in products_obj]
+        }
+        response = client.post("/orders", json=order_data, headers=auth_headers)
+        assert response.status_code == 200, response.text
+
+        events = []
+        while len(events) < 3 and select.select([dbapi_connection], [], [], 5) != ([], [], []):
+            dbapi_connection.poll()
+            while dbapi_connection.notifies:
+                events.append(json.loads(dbapi_connection.notifies.pop(0).payload))
+    finally:
+        connection.invalidate()
+
+    # a notificação leva só o id; o evento é lido da outbox
+    assert all(list(e) == ["outbox"] for e in events)
+    stored = read_outbox_events([e["outbox"] for e in events])
+    events = [stored[e["outbox"]] for e in events]
+    order_events = [e for e in events if e["type"] == "order"]
+    product_events = {e["prod_id"]: e for e in events if e["type"] == "product"}
+    assert order_events[0]["order_id"] == response.json()["order_id"]
+    assert order_events[0]["order_status"] == "em andamento"
+    assert product_events[products_obj[0].prod_id]["prod_stock"] == 9
+
+    
+    
+    
+
+def test_outbox_relay_publishes_order_events(
+    client: TestClient,
+    client_obj,
+    products_obj,
+    session: Session,
+    auth_headers
+):
+    order_data = {
+        "order_section": "blusas",
+        "order_cli": client_obj.cli_id,
+        "order_typepay": "crédito",
+        "order_address": "Test Address 123",
+        "order_prods": [p.prod_id for p in products_obj]
+    }
+    response = client.post("/orders", json=order_data, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    order_id = response.json()["order_id"]
+    client.put(f"/orders/{order_id}", json={"order_status": "Pagamento Confirmado"}, headers=auth_headers)
+
+    sink = QueueSink()
+
+    # outro relay com a trava: este não publica nada
+    session.exec(text("SELECT pg_advisory_lock(hashtext(:name))").bindparams(name=OUTBOX_RELAY_LOCK))
+    assert relay_outbox_batch(target=sink) == 0
+    session.exec(text("SELECT pg_advisory_unlock(hashtext(:name))").bindparams(name=OUTBOX_RELAY_LOCK))
+    session.commit()
+
+    assert relay_outbox_batch(target=sink) == 4
+    assert relay_outbox_batch(target=sink) == 0
+
+    events = [sink.queue.get_nowait() for _ in range(sink.queue.qsize())]
+    order_events = [e["payload"]["order_status"] for e in events if e["type"] == "order"]
+    assert order_events == ["em andamento", "pagamento confirmado"]
+    assert [e["id"] for e in events] == sorted(e["id"] for e in events)
+
+    # publicados e fora da retenção são removidos; pendentes ficam
+    client.put(f"/orders/{order_id}", json={"order_status": "Preparando para a entrega"}, headers=auth_headers)
+    assert purge_published_outbox(retention_hours=0) == 4
+    session.expire_all()
+    pending = session.exec(sql_select(OutboxEvent)).all()
+    assert [e.evt_published for e in pending] == [False]
@@ -0,0 +1,156 @@
+import pytest, time, logging
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+from sqlalchemy.exc import OperationalError
+from app.utils.retry import transaction_attempts, transaction_metrics
+from app.utils.metrics import render_metrics, LATENCY_BUCKETS
+from app.utils import database, metrics
+
+
+class DeadlockDetected(Exception):
+    pgcode = "40P01"
+
+
+def test_transaction_retried_after_deadlock(session: Session):
+    calls = []
+    
+    for attempt in transaction_attempts(session, "test_retry", retries=2):
+        with attempt:
+            calls.append(attempt.attempt)
+            if len(calls) == 1:
+                raise OperationalError("UPDATE product", {}, DeadlockDetected())
+            break
+        
+    assert calls == [0, 1]
+    stats = transaction_metrics()["test_retry"]
+    assert stats["retried"] == 1
+    assert stats["committed"] == 1
+    assert stats["pgcode_40P01"] == 1
+    
+    
+
+
+def test_transaction_aborted_with_conflict(session: Session):
+    with pytest.raises(HTTPException) as exc:
+        for attempt in transaction_attempts(session, "test_abort", retries=1):
+            with attempt:
+                raise OperationalError("UPDATE product", {}, DeadlockDetected())
+            
+    assert exc.value.status_code == 409
+    assert transaction_metrics()["test_abort"]["aborted"] == 1
+    
+    
+
+
+def test_transaction_metrics_endpoint(
+    client: TestClient,
+    client_obj,
+    products_obj,
+    auth_headers
+):
+    order_data = {
+        "order_section": "blusas",
+        "order_cli": client_obj.cli_id,
+        "order_typepay": "crédito",
+        "order_address": "Test Address 123",
+        "order_prods": [p.prod_id for p in products_obj]
+    }
+    assert client.post("/orders", json=order_data, headers=auth_headers).status_code == 200
+
+    response = client.get("/metrics/transactions", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["orders_post"]["committed"] >= 1
+    
+    
+
+
+def test_prometheus_metrics_endpoint(
+    client: TestClient,
+    products_obj,
+    auth_headers
+):
+    assert client.get(f"/products/{products_obj[0].prod_id}", headers=auth_headers).status_code == 200
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert "# TYPE http_request_duration_seconds histogram" in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/products/{id}",status="200",le="+Inf"}' in text
+    assert 'db_queries_total{route="/products/{id}"}' in text
+    assert "db_pool_checked_out" in text
+    
+    
+
+
+def test_metrics_merge_across_workers():
+    now = time.time()
+    worker = {
+        "time": now,
+        "histograms": [["http_request_duration_seconds", {"method": "GET", "route": "/orders", "status": "200"}, [1] + [0] * len(LATENCY_BUCKETS), 0.004, 1]],
+        "counters": [["db_queries_total", {"route": "/orders"}, 3]],
+        "gauges": [["http_requests_in_flight", {}, 2]],
+    }
+    text = render_metrics([{**worker, "process": "1-1"}, {**worker, "process": "2-1", "time": now - 3600}], now=now)
+
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/orders",status="200",le="0.005"} 2' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/orders",status="200"} 2' in text
+    assert 'db_queries_total{route="/orders"} 6' in text
+    assert 'http_requests_in_flight{process="1-1"} 2' in text
+    assert 'process="2-1"' not in text
+    
+    
+
+
+def test_stale_worker_snapshots_retired(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    now = time.time()
+    dead = {
+        "process": "7-1",
+        "time": now - 3600,
+        "histograms": [],
+        "counters": [["db_queries_total", {"route": "/workers"}, 5]],
+        "gauges": [],
+    }
+    metrics.write_snapshot(dead)
+
+    text = render_metrics(metrics.collect_snapshots(now=now), now=now)
+    assert 'db_queries_total{route="/workers"} 5' in text
+    assert not (tmp_path / "metrics_7-1.json").exists()
+
+    # mesmo pid reaproveitado por um novo worker: arquivo novo, contador não regride
+    metrics.write_snapshot({**dead, "process": "7-2", "time": now, "counters": [["db_queries_total", {"route": "/workers"}, 1]]})
+    text = render_metrics(metrics.collect_snapshots(now=now), now=now)
+    assert 'db_queries_total{route="/workers"} 6' in text
+    
+    
+
+
+def test_server_timing_and_slow_query_log(
+    client: TestClient,
+    products_obj,
+    auth_headers,
+    monkeypatch,
+    caplog
+):
+    monkeypatch.setattr(database, "SQL_SLOW_QUERY_MS", 0)
+
+    with caplog.at_level(logging.WARNING, logger="app.sql"):
+        response = client.get(f"/products/{products_obj[0].prod_id}", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert response.headers["Server-Timing"].startswith("db;dur=")
+    assert 'queries"' in response.headers["Server-Timing"]
+    assert any("Consulta lenta" in r.message and "/products/{id}" in r.message for r in caplog.records)
+    
+    
+
+
+def test_repeated_statement_shapes_flagged():
+    stats = database.RequestStats()
+    for prod_id in range(12):
+        stats.shapes[database.statement_shape(f"SELECT * FROM product WHERE prod_id = {prod_id}")] += 1
+    stats.shapes[database.statement_shape("SELECT * FROM client WHERE cli_id IN (%(id_1)s, %(id_2)s)")] += 1
+
+    assert database.repeated_statements(stats, threshold=10) == [("SELECT * FROM product WHERE prod_id = ?", 12)]
@@ -1,9 +1,27 @@
 from fastapi.testclient import TestClient
-from sqlmodel import Session
-from datetime import datetime
+from sqlmodel import Session, select
+from sqlalchemy import update, text
+from sqlalchemy.exc import OperationalError
+from datetime import date, datetime, timedelta
 from app.models.model_product import Product
 from app.models.model_order import Order
+from app.models.model_reservation import StockReservation
+from app.utils.reservations import sweep_expired_reservations
+from app.utils.partitions import archive_order_partition, create_order_partitions, ensure_order_partitions, order_partition_name
 from app.utils.custom_types import StatusType, SectionType, PaymentType
+from app.utils.serialization import model_columns
+from app.utils.retry import transaction_metrics
+from app.utils import order_status
+from app.endpoints import api_order
+
+
+class SerializationFailure(Exception):
+    pgcode = "40001"
+
+
+class DeadlockDetected(Exception):
+    pgcode = "40P01"
+
 
 def test_create_order(
     client: TestClient,
@@ -30,6 +48,52 @@ def test_create_order(
     
     
 
+def test_create_order_computes_total_with_quantities(
+    client: TestClient,
+    client_obj,
+    products_obj,
+    auth_headers
+):
+    order_data = {
+        "order_section": "blusas",
+        "order_cli": client_obj.cli_id,
+        "order_typepay": "pix",
+        "order_address": "Test Address 123",
+        "order_prods": [products_obj[0].prod_id, products_obj[0].prod_id, products_obj[1].prod_id]
+    }
+    response = client.post("/orders", json=order_data, headers=auth_headers)
+    data = response.json()
+    assert response.status_code == 200, response.text
+    assert data["order_total"] == 42.48
+    quantities = {item["prod_id"]: item["qty"] for item in data["order_items"]}
+    assert quantities[products_obj[0].prod_id] == 2
+    assert quantities[products_obj[1].prod_id] == 1
+    
+    
+    
+
+
+def test_create_order_with_wrong_total(
+    client: TestClient,
+    client_obj,
+    products_obj,
+    auth_headers
+):
+    order_data = {
+        "order_section": "blusas",
+        "order_cli": client_obj.cli_id,
+        "order_total": 1.00,
+        "order_typepay": "crédito",
+        "order_address": "Test Address 123",
+        "order_prods": [p.prod_id for p in products_obj]
+    }
+    response = client.post("/orders", json=order_data, headers=auth_headers)
+    assert response.status_code == 400
+    assert "divergente" in response.json()["detail"]
+    
+    
+    
+
 def test_create_order_with_invalid_client(
     client: TestClient,
     products_obj,
@@ -86,6 +150,38 @@ def test_create_order_with_out_of_stock_product(
     
     
 
+def test_create_order_idempotency_key_replay(
+    client: TestClient,
+    client_obj,
+    products_obj,
+    auth_headers
+):
+    order_data = {
+        "order_section": "blusas",
+        "order_cli": client_obj.cli_id,
+        "order_total": 31.49,
+        "order_typepay": "crédito",
+        "order_address": "Test Address 123",
+        "order_prods": [p.prod_id for p in products_obj]
+    }
+    headers = {**auth_headers, "Idempotency-Key": "pedido-pos-0001"}
+    first = client.post("/orders", json=order_data, headers=headers)
+    second = client.post("/orders", json=order_data, headers=headers)
+    assert first.status_code == 200, first.text
+    assert second.status_code == 200, second.text
+    assert second.json()["order_id"] == first.json()["order_id"]
+    assert second.headers.get("Idempotent-Replayed") == "true"
+
+    product = client.get(f"/products/{products_obj[0].prod_id}", headers=auth_headers).json()
+    assert product["prod_stock"] == 9
+
+    order_data["order_address"] = "Outro Endereço 456"
+    response = client.post("/orders", json=order_data, headers=headers)
+    assert response.status_code == 422
+    
+    
+    
+
 def test_get_order(
     client: TestClient,
     order_obj,
@@ -125,9 +221,59 @@ def test_list_orders(
 
 
 
+def test_list_orders_same_shape_as_response_model(
+    client: TestClient,
+    order_obj,
+    auth_headers
+):
+    response = client.get("/orders", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert len(data) == 1
+
+    expected = client.get(f"/orders/{order_obj.order_id}", headers=auth_headers).json()
+    assert data[0] == expected
+    assert list(data[0]) == [column.name for column in model_columns(Order)]
+
+
+
+
+def test_list_orders_with_fields(
+    client: TestClient,
+    order_obj,
+    auth_headers
+):
+    response = client.get("/orders", params={"fields": "order_id,order_status"}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert response.json() == [{"order_id": order_obj.order_id, "order_status": "em andamento"}]
+
+    response = client.get("/orders", params={"fields": "order_items,senha"}, headers=auth_headers)
+    assert response.status_code == 400, response.text
+
+
+
+
+def test_list_orders_without_filters_and_by_id(
+    client: TestClient,
+    order_obj,
+    auth_headers
+):
+    # a rota de listagem não tem {id} no caminho: sem filtros deve responder 200
+    response = client.get("/orders", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert [o["order_id"] for o in response.json()] == [order_obj.order_id]
+
+    response = client.get("/orders", params={"id": order_obj.order_id + 1}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert response.json() == []
+
+
+
+
 def test_list_orders_with_filters(
     client: TestClient,
     client_obj,
+    order_obj,
     auth_headers
 ):
     response = client.get(f"/orders?client={client_obj.cli_id}", headers=auth_headers)
@@ -154,6 +300,55 @@ def test_list_orders_with_filters(
 
 
 
+def test_list_orders_by_date_range(
+    client: TestClient,
+    order_obj,
+    auth_headers
+):
+    today = datetime.utcnow().date()
+    response = client.get(f"/orders?period={today.isoformat()}", headers=auth_headers)
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+
+    response = client.get(f"/orders?from={(today - timedelta(days=7)).isoformat()}&to={today.isoformat()}", headers=auth_headers)
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+
+    response = client.get(f"/orders?from={(today + timedelta(days=1)).isoformat()}", headers=auth_headers)
+    assert response.status_code == 200
+    assert len(response.json()) == 0
+
+    response = client.get(f"/orders?to={(today - timedelta(days=1)).isoformat()}", headers=auth_headers)
+    assert response.status_code == 200
+    assert len(response.json()) == 0
+
+    # o limite superior é inclusivo no dia inteiro
+    response = client.get(f"/orders?from={today.isoformat()}&to={today.isoformat()}", headers=auth_headers)
+    assert response.status_code == 200
+    assert [o["order_id"] for o in response.json()] == [order_obj.order_id]
+
+
+
+
+def test_list_orders_by_product(
+    client: TestClient,
+    order_obj,
+    products_obj,
+    auth_headers
+):
+    response = client.get(f"/orders?product={products_obj[0].prod_id}", headers=auth_headers)
+    data = response.json()
+    assert response.status_code == 200
+    assert [o["order_id"] for o in data] == [order_obj.order_id]
+
+    response = client.get("/orders?product=999999", headers=auth_headers)
+    data = response.json()
+    assert response.status_code == 200
+    assert len(data) == 0
+
+
+
+
 def test_update_order_status(
     client: TestClient,
     order_obj,
@@ -164,10 +359,148 @@ def test_update_order_status(
     data = response.json()
     assert response.status_code == 200
     assert data["order_status"] == "pagamento confirmado"
+
+
+
+def test_update_order_status_rejects_invalid_transition(
+    client: TestClient,
+    order_obj,
+    products_obj,
+    auth_headers
+):
+    url = f"/orders/{order_obj.order_id}"
+    assert client.put(url, json={"order_status": "Cancelado"}, headers=auth_headers).status_code == 200
+    stock = client.get(f"/products/{products_obj[0].prod_id}", headers=auth_headers).json()["prod_stock"]
+
+    # pedido cancelado (estoque já devolvido) não volta a ficar em andamento
+    response = client.put(url, json={"order_status": "em andamento"}, headers=auth_headers)
+    assert response.status_code == 400, response.text
+    assert "Transição inválida" in response.json()["detail"]
+
+    response = client.put(url, json={"order_status": "inexistente"}, headers=auth_headers)
+    assert response.status_code == 400, response.text
+
+    # repetir o status atual não devolve o estoque de novo
+    assert client.put(url, json={"order_status": "Cancelado"}, headers=auth_headers).status_code == 200
+    assert client.get(url, headers=auth_headers).json()["order_status"] == "cancelado"
+    assert client.get(f"/products/{products_obj[0].prod_id}", headers=auth_headers).json()["prod_stock"] == stock
+    
+    
+    
+
+def test_bulk_update_order_status(
+    client: TestClient,
+    order_obj,
+    auth_headers
+):
+    response = client.post(
+        "/orders/bulk-status",
+        json={"order_status": "pagamento confirmado", "order_ids": [order_obj.order_id, 99999]},
+        headers=auth_headers
+    )
+    data = response.json()
+    assert response.status_code == 200, response.text
+    assert data["updated"] == 1
+    results = {r["order_id"]: r for r in data["results"]}
+    assert results[order_obj.order_id]["ok"] is True
+    assert results[99999]["ok"] is False
+
+    response = client.post(
+        "/orders/bulk-status",
+        json={"order_status": "entregue", "filter_status": "pagamento confirmado"},
+        headers=auth_headers
+    )
+    data = response.json()
+    assert response.status_code == 200, response.text
+    assert data["updated"] == 0
+    assert data["results"][0]["ok"] is False
+    assert "Transição inválida" in data["results"][0]["detail"]
+
+    response = client.get(f"/orders/{order_obj.order_id}", headers=auth_headers)
+    assert response.json()["order_status"] == "pagamento confirmado"
+
+
+
+def test_bulk_update_order_status_rejects_oversized_filter(
+    client: TestClient,
+    order_obj,
+    client_obj,
+    products_obj,
+    auth_headers,
+    monkeypatch
+):
+    order_data = {
+        "order_section": "blusas",
+        "order_cli": client_obj.cli_id,
+        "order_typepay": "crédito",
+        "order_address": "Test Address 123",
+        "order_prods": [products_obj[0].prod_id]
+    }
+    assert client.post("/orders", json=order_data, headers=auth_headers).status_code == 200
+    monkeypatch.setattr(api_order, "BULK_STATUS_LIMIT", 1)
+
+    response = client.post(
+        "/orders/bulk-status",
+        json={"order_status": "pagamento confirmado", "filter_status": "em andamento"},
+        headers=auth_headers
+    )
+    assert response.status_code == 422, response.text
+
+    response = client.get("/orders", params={"status": "em andamento"}, headers=auth_headers)
+    assert len(response.json()) == 2
     
     
     
 
+def test_update_order_status_retried_after_serialization_failure(
+    client: TestClient,
+    order_obj,
+    auth_headers,
+    monkeypatch
+):
+    calls = []
+    publish_events = order_status.publish_events
+
+    def flaky_publish_events(session, events):
+        calls.append(1)
+        if len(calls) == 1:
+            raise OperationalError('UPDATE "order"', {}, SerializationFailure())
+        publish_events(session, events)
+
+    monkeypatch.setattr(order_status, "publish_events", flaky_publish_events)
+    retried = transaction_metrics().get("orders_put", {}).get("retried", 0)
+
+    response = client.put(f"/orders/{order_obj.order_id}", json={"order_status": "Pagamento Confirmado"}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["order_status"] == "pagamento confirmado"
+    assert len(calls) == 2
+    assert transaction_metrics()["orders_put"]["retried"] == retried + 1
+
+
+
+def test_update_order_status_conflict_after_retries(
+    client: TestClient,
+    order_obj,
+    auth_headers,
+    monkeypatch
+):
+    def deadlocked_publish_events(session, events):
+        raise OperationalError('UPDATE "order"', {}, DeadlockDetected())
+
+    monkeypatch.setattr(order_status, "publish_events", deadlocked_publish_events)
+    aborted = transaction_metrics().get("orders_put", {}).get("aborted", 0)
+
+    response = client.put(f"/orders/{order_obj.order_id}", json={"order_status": "Pagamento Confirmado"}, headers=auth_headers)
+    assert response.status_code == 409, response.text
+    assert transaction_metrics()["orders_put"]["aborted"] == aborted + 1
+
+    # nenhuma tentativa foi confirmada
+    monkeypatch.undo()
+    response = client.get(f"/orders/{order_obj.order_id}", headers=auth_headers)
+    assert response.json()["order_status"] == "em andamento"
+
+
+
 def test_update_nonexistent_order(
     client: TestClient,
     auth_headers
@@ -194,6 +527,204 @@ def test_delete_order(
     
     
 
+def test_cancel_and_delete_order_restock_once(
+    client: TestClient,
+    client_obj,
+    products_obj,
+    auth_headers
+):
+    order_data = {
+        "order_section": "blusas",
+        "order_cli": client_obj.cli_id,
+        "order_typepay": "crédito",
+        "order_address": "Test Address 123",
+        "order_prods": [products_obj[0].prod_id, products_obj[0].prod_id]
+    }
+    create_resp = client.post("/orders", json=order_data, headers=auth_headers)
+    assert create_resp.status_code == 200, create_resp.text
+    order_id = create_resp.json()["order_id"]
+    product_url = f"/products/{products_obj[0].prod_id}"
+    assert client.get(product_url, headers=auth_headers).json()["prod_stock"] == 8
+
+    response = client.put(f"/orders/{order_id}", json={"order_status": "Cancelado"}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["order_restocked"] is True
+    assert client.get(product_url, headers=auth_headers).json()["prod_stock"] == 10
+
+    client.put(f"/orders/{order_id}", json={"order_status": "Cancelado"}, headers=auth_headers)
+    client.delete(f"/orders/{order_id}", headers=auth_headers)
+    assert client.get(product_url, headers=auth_headers).json()["prod_stock"] == 10
+    
+    
+    
+
+def test_expired_reservation_cancels_order(
+    client: TestClient,
+    client_obj,
+    products_obj,
+    session: Session,
+    auth_headers
+):
+    order_data = {
+        "order_section": "blusas",
+        "order_cli": client_obj.cli_id,
+        "order_typepay": "boleto",
+        "order_address": "Test Address 123",
+        "order_prods": [p.prod_id for p in products_obj]
+    }
+    create_resp = client.post("/orders", json=order_data, headers=auth_headers)
+    assert create_resp.status_code == 200, create_resp.text
+    order_id = create_resp.json()["order_id"]
+
+    session.exec(
+        update(StockReservation)
+        .where(StockReservation.res_order == order_id)
+        .values(res_expiresat=datetime.utcnow() - timedelta(minutes=1))
+    )
+    session.commit()
+
+    # pedido travado por outra transação: o SKIP LOCKED o pula e a reserva continua ativa
+    session.exec(select(Order).where(Order.order_id == order_id).with_for_update()).all()
+    assert sweep_expired_reservations() == 0
+    active = select(StockReservation).where(StockReservation.res_order == order_id, StockReservation.res_active == True)
+    session.expire_all()
+    assert len(session.exec(active).all()) == 2
+    session.commit()
+
+    assert sweep_expired_reservations() == 2
+    assert sweep_expired_reservations() == 0
+
+    response = client.get(f"/orders/{order_id}", headers=auth_headers)
+    assert response.json()["order_status"] == "cancelado"
+    product = client.get(f"/products/{products_obj[0].prod_id}", headers=auth_headers).json()
+    assert product["prod_stock"] == 10
+
+
+
+def test_sweep_releases_stale_reservations(
+    client: TestClient,
+    client_obj,
+    products_obj,
+    session: Session,
+    auth_headers
+):
+    order_data = {
+        "order_section": "blusas",
+        "order_cli": client_obj.cli_id,
+        "order_typepay": "boleto",
+        "order_address": "Test Address 123",
+        "order_prods": [p.prod_id for p in products_obj]
+    }
+    create_resp = client.post("/orders", json=order_data, headers=auth_headers)
+    assert create_resp.status_code == 200, create_resp.text
+    order_id = create_resp.json()["order_id"]
+
+    # pedido fora de "em andamento" com reserva ainda ativa e vencida
+    session.exec(update(Order).where(Order.order_id == order_id).values(order_status=StatusType.pagamentook))
+    session.exec(
+        update(StockReservation)
+        .where(StockReservation.res_order == order_id)
+        .values(res_expiresat=datetime.utcnow() - timedelta(minutes=1))
+    )
+    session.commit()
+
+    assert sweep_expired_reservations() == 2
+    assert sweep_expired_reservations() == 0
+
+    response = client.get(f"/orders/{order_id}", headers=auth_headers)
+    assert response.json()["order_status"] == "pagamento confirmado"
+    product = client.get(f"/products/{products_obj[0].prod_id}", headers=auth_headers).json()
+    assert product["prod_stock"] == 9
+    
+    
+    
+
+def test_orders_are_routed_to_monthly_partitions(
+    client: TestClient,
+    order_obj,
+    session: Session,
+    auth_headers
+):
+    partition = session.exec(
+        text('SELECT tableoid::regclass::text FROM "order" WHERE order_id = :id').bindparams(id=order_obj.order_id)
+    ).scalar_one()
+    assert partition == order_partition_name(order_obj.order_createdat.date())
+
+    response = client.get(f"/orders/{order_obj.order_id}", headers=auth_headers)
+    assert response.status_code == 200
+    
+    
+    
+
+def test_archive_old_order_partition(
+    client: TestClient,
+    client_obj,
+    products_obj,
+    session: Session,
+    auth_headers,
+    tmp_path
+):
+    month = date(2001, 1, 1)
+    create_order_partitions(session.connection(), month, month)
+    order = Order(
+        order_section=SectionType.blusas,
+        order_cli=client_obj.cli_id,
+        order_total=10.99,
+        order_typepay=PaymentType.credito,
+        order_address="Test Address 123",
+        order_prods=[products_obj[0].prod_id],
+        order_status=StatusType.entregue,
+        order_createdat=datetime(2001, 1, 15),
+        order_period=datetime(2001, 1, 15)
+    )
+    session.add(order)
+    session.commit()
+    order_id = order.order_id
+
+    path = archive_order_partition(month, tmp_path)
+    assert path.endswith("archive_order_2001_01.csv.gz")
+    assert (tmp_path / "archive_order_2001_01.csv.gz").exists()
+
+    response = client.get(f"/orders/{order_id}", headers=auth_headers)
+    assert response.status_code == 404
+
+
+
+def test_split_old_orders_out_of_default_partition(
+    client_obj,
+    products_obj,
+    session: Session,
+    tmp_path
+):
+    # mês sem partição: o pedido cai em order_default
+    order = Order(
+        order_section=SectionType.blusas,
+        order_cli=client_obj.cli_id,
+        order_total=10.99,
+        order_typepay=PaymentType.credito,
+        order_address="Test Address 123",
+        order_prods=[products_obj[0].prod_id],
+        order_status=StatusType.entregue,
+        order_createdat=datetime(2002, 3, 10),
+        order_period=datetime(2002, 3, 10)
+    )
+    session.add(order)
+    session.commit()
+    order_id = order.order_id
+    partition_of = text('SELECT tableoid::regclass::text FROM "order" WHERE order_id = :id').bindparams(id=order_id)
+    assert session.exec(partition_of).scalar() == "order_default"
+    session.commit()
+
+    assert "order_2002_03" in ensure_order_partitions()
+    assert session.exec(partition_of).scalar() == "order_2002_03"
+    session.commit()
+
+    archive_order_partition(date(2002, 3, 1), tmp_path)
+    assert session.exec(partition_of).scalar() is None
+    
+    
+    
+
 def test_delete_nonexistent_order(
     client: TestClient,
     auth_headers
@@ -2,6 +2,16 @@ import pytest, io, json
 from sqlmodel import Session
 from datetime import datetime
 from app.models.model_product import Product
+from app.utils.purge import purge_deleted_products
+from app.utils.serialization import model_columns
+from app.utils.retry import transaction_metrics
+from app.endpoints import api_product
+from sqlalchemy.exc import OperationalError
+
+
+class DeadlockDetected(Exception):
+    pgcode = "40P01"
+
 
 def test_create_product_success(
     client,
@@ -114,6 +124,61 @@ def test_get_product_by_id(
     
     
 
+def test_list_products_same_shape_as_response_model(
+    client,
+    products_obj,
+    auth_headers
+):
+    response = client.get("/products", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/json"
+
+    # a listagem serializada direto das linhas deve sair igual ao response_model, com as chaves na ordem de model_columns
+    for product in response.json():
+        expected = client.get(f"/products/{product['prod_id']}", headers=auth_headers).json()
+        assert product == expected
+        assert list(product) == [column.name for column in model_columns(Product)]
+    
+    
+    
+    
+def test_list_products_with_fields(
+    client,
+    products_obj,
+    auth_headers
+):
+    response = client.get("/products", params={"fields": "prod_price,prod_id, prod_name"}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert len(data) == len(products_obj)
+    # chaves na ordem do modelo, independente da ordem pedida
+    assert all(list(product) == ["prod_price", "prod_name", "prod_id"] for product in data)
+
+    # uma coluna só: o select devolve escalares
+    response = client.get("/products", params={"fields": "prod_id"}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert sorted(product["prod_id"] for product in response.json()) == sorted(product.prod_id for product in products_obj)
+
+    response = client.get("/products", params={"fields": "prod_id,preco"}, headers=auth_headers)
+    assert response.status_code == 400, response.text
+    assert "preco" in response.json()["detail"]["msg"]
+    assert "prod_price" in response.json()["detail"]["campos_validos"]
+    
+    
+    
+    
+def test_list_products_schema_allows_partial_items(client):
+    schema = client.get("/openapi.json").json()
+    items = schema["paths"]["/products"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]["items"]
+    fields = schema["components"]["schemas"][items["$ref"].split("/")[-1]]
+
+    # com fields cada item traz só as chaves pedidas: nenhuma é obrigatória no esquema
+    assert "prod_id" in fields["properties"]
+    assert not fields.get("required")
+    
+    
+    
+    
 def test_update_product(
     client,
     session: Session,
@@ -143,6 +208,34 @@ def test_update_product(
     )
     assert response.status_code == 200, response.text
     assert response.json()["prod_price"] == 120
+
+
+
+def test_update_product_retried_after_deadlock(
+    client,
+    create_product,
+    auth_headers,
+    monkeypatch
+):
+    calls = []
+    publish_events = api_product.publish_events
+
+    def flaky_publish_events(session, events):
+        calls.append(1)
+        if len(calls) == 1:
+            raise OperationalError("UPDATE product", {}, DeadlockDetected())
+        publish_events(session, events)
+
+    monkeypatch.setattr(api_product, "publish_events", flaky_publish_events)
+    response = client.put(
+        f"/products/{create_product.prod_id}",
+        data={"data": json.dumps({"prod_stock": 25})},
+        headers=auth_headers
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["prod_stock"] == 25
+    assert len(calls) == 2
+    assert transaction_metrics()["products_put"]["retried"] >= 1
     
     
     
@@ -177,6 +270,35 @@ def test_delete_product(
     
     
 
+def test_soft_delete_and_purge_product(
+    client,
+    create_product,
+    session: Session,
+    auth_headers
+):
+    product_id = create_product.prod_id
+    response = client.delete(f"/products/{product_id}", headers=auth_headers)
+    assert response.status_code == 200, response.text
+
+    assert client.get(f"/products/{product_id}", headers=auth_headers).status_code == 404
+    assert client.delete(f"/products/{product_id}", headers=auth_headers).status_code == 404
+    assert client.put(f"/products/{product_id}", data={"data": "{}"}, headers=auth_headers).status_code == 404
+    listed = client.get("/products", params={"limit": 10}, headers=auth_headers).json()
+    assert product_id not in [p["prod_id"] for p in listed]
+
+    session.expire_all()
+    tombstone = session.get(Product, product_id)
+    assert tombstone.prod_active is False
+    assert tombstone.prod_deletedat is not None
+
+    assert purge_deleted_products(retention_days=0) >= 1
+    session.expire_all()
+    assert session.get(Product, product_id) is None
+    
+    
+    
+    
+
 def test_upload_product_image_success(
     create_product,
     client,
@@ -322,4 +444,41 @@ def test_delete_product_image_product_not_found(
     assert "Produto não encontrado" in resp.json()["detail"]
     
     
-    
\ No newline at end of file
+        
+
+def test_reserved_stock_metrics(
+    client,
+    client_obj,
+    products_obj,
+    auth_headers
+):
+    order_data = {
+        "order_section": "blusas",
+        "order_cli": client_obj.cli_id,
+        "order_typepay": "pix",
+        "order_address": "Test Address 123",
+        "order_prods": [products_obj[0].prod_id]
+    }
+    create_resp = client.post("/orders", json=order_data, headers=auth_headers)
+    assert create_resp.status_code == 200, create_resp.text
+    order_id = create_resp.json()["order_id"]
+
+    response = client.get(f"/products/reservations?product={products_obj[0].prod_id}", headers=auth_headers)
+    data = response.json()
+    assert response.status_code == 200, response.text
+    assert data["reserved"] == 1
+    assert data["available"] == 9
+    assert data["products"][0]["prod_id"] == products_obj[0].prod_id
+
+    client.put(f"/orders/{order_id}", json={"order_status": "Pagamento Confirmado"}, headers=auth_headers)
+    response = client.get(f"/products/reservations?product={products_obj[0].prod_id}", headers=auth_headers)
+    assert response.json()["reserved"] == 0
+    assert response.json()["products"] == []
+
+    # produto removido não conta como disponível
+    client.delete(f"/products/{products_obj[1].prod_id}", headers=auth_headers)
+    response = client.get(f"/products/reservations?product={products_obj[1].prod_id}", headers=auth_headers)
+    assert response.json()["available"] == 0
+    
+    
+    